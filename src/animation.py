@@ -0,0 +1,48 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+
+def scale_sprite(sprite: np.ndarray, scale: float) -> np.ndarray:
+    if scale == 1.0:
+        return sprite
+    height, width = sprite.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return np.asarray(Image.fromarray(sprite).resize(size, Image.Resampling.BILINEAR))
+
+
+class ScaleAnimation:
+    """
+    A sprite whose scale follows `scale(t)` for the first `duration` seconds and then
+    stays at `tail_scale`. The few distinct frames of the animated part are resampled
+    once, at `fps`, and the static tail is a single bitmap, so playing it back never
+    resamples anything.
+    """
+
+    def __init__(self, sprite: np.ndarray, scale, duration: float, fps: int, tail_scale: float = 1.0):
+        self.fps = fps
+        self.frames = [scale_sprite(sprite, scale(i / fps)) for i in range(math.ceil(duration * fps))]
+        self.tail = scale_sprite(sprite, tail_scale)
+        self._masks = {}
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the frames and the tail; the tail may be the source sprite itself."""
+        return sum(frame.nbytes for frame in self.frames) + self.tail.nbytes
+
+    def frame(self, t: float) -> np.ndarray:
+        """RGBA bitmap at time t, relative to the start of the animation."""
+        index = int(t * self.fps + 1e-6)
+        return self.frames[index] if 0 <= index < len(self.frames) else self.tail
+
+    def rgb(self, t: float) -> np.ndarray:
+        return self.frame(t)[..., :3]
+
+    def mask(self, t: float) -> np.ndarray:
+        """Alpha of frame(t) as floats in [0, 1], converted once per distinct frame."""
+        bitmap = self.frame(t)
+        key = id(bitmap)
+        if key not in self._masks:
+            self._masks[key] = bitmap[..., 3] / 255.0
+        return self._masks[key]
@@ -0,0 +1,103 @@
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+import ffmpeg_binaries
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+ENVELOPE_SECONDS = 0.01
+# envelope blocks handled per step when measuring and mixing (10 s at 10 ms blocks)
+WINDOW_BLOCKS = 1000
+
+
+def decode(path: Path, sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS, speed: float = 1.0) -> np.ndarray:
+    """
+    Decodes an audio file straight into a float32 (samples, channels) array.
+
+    `speed` is a duration ratio, as for audiostretchy: 0.85 makes the audio 15%
+    shorter without changing pitch. The time-stretch runs inside the same ffmpeg
+    decode, so no stretched copy is written to disk.
+    """
+    command = [ffmpeg_binaries.ffmpeg(), "-v", "error", "-i", str(path)]
+    if speed != 1.0:
+        command += ["-af", f"atempo={1.0 / speed:.6f}"]
+    command += ["-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sample_rate), "-"]
+    result = subprocess.run(command, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, channels)
+
+
+def _levels(voice: np.ndarray, block: int) -> np.ndarray:
+    """RMS of the channel-averaged magnitude per `block` samples, the last block zero-padded."""
+    levels = []
+    step = block * WINDOW_BLOCKS
+    for start in range(0, len(voice), step):
+        piece = voice[start:start + step]
+        mono = np.abs(piece).mean(axis=1) if piece.ndim == 2 else np.abs(piece)
+        count = -(-len(mono) // block)
+        mono = np.pad(mono, (0, count * block - len(mono)))
+        levels.append(np.sqrt((mono.reshape(count, block) ** 2).mean(axis=1)))
+    return np.concatenate(levels)
+
+
+def duck_gain(voice: np.ndarray, sample_rate: int, speech_volume: float, idle_volume: float,
+              attack: float = 0.05, release: float = 0.4) -> np.ndarray:
+    """
+    Music gain per ENVELOPE_SECONDS block of `voice`: `idle_volume` while nobody
+    talks, easing down to `speech_volume` under the voice with separate attack/release
+    times.
+    """
+    if len(voice) == 0:
+        return np.zeros(0, dtype=np.float32)
+    level = _levels(voice, max(1, int(sample_rate * ENVELOPE_SECONDS)))
+    active = (level > max(1e-4, 0.1 * np.percentile(level, 95))).astype(np.float32)
+
+    attack_coef = 1.0 - np.exp(-ENVELOPE_SECONDS / attack)
+    release_coef = 1.0 - np.exp(-ENVELOPE_SECONDS / release)
+    envelope = np.empty_like(active)
+    current = 0.0
+    for i, target in enumerate(active):
+        current += (target - current) * (attack_coef if target > current else release_coef)
+        envelope[i] = current
+
+    return idle_volume + (speech_volume - idle_volume) * envelope
+
+
+def mix(voice1: np.ndarray, voice2: np.ndarray, music: np.ndarray, music_volume: float, music_idle_volume: float,
+        sample_rate: int = SAMPLE_RATE, tail: float = 2.0, trim: float = 0.5) -> np.ndarray:
+    """
+    Pre-mixes the final soundtrack: voice1 then voice2, `tail` seconds of music after
+    the voices, the music looped and ducked under speech, and `trim` seconds cut off
+    the end to avoid encoder trailing issues.
+
+    Memory still grows with the video's length: the decoded voices plus one
+    full-length soundtrack buffer, which is mixed in place. Measuring the voice level
+    and adding the ducked music go through it WINDOW_BLOCKS envelope blocks at a time,
+    so their temporaries stay window-sized.
+    """
+    voiced = len(voice1) + len(voice2)
+    total = voiced + int(tail * sample_rate)
+    length = max(0, total - int(trim * sample_rate))
+    track = np.zeros((total, voice1.shape[1]), dtype=np.float32)
+    track[:len(voice1)] = voice1
+    track[len(voice1):voiced] = voice2
+
+    block = max(1, int(sample_rate * ENVELOPE_SECONDS))
+    gain = duck_gain(track, sample_rate, music_volume, music_idle_volume)
+    if len(music):
+        step = block * WINDOW_BLOCKS
+        for start in range(0, length, step):
+            stop = min(length, start + step)
+            window_gain = np.repeat(gain[start // block:-(-stop // block)], block)[:stop - start, None]
+            # the music loops, possibly more than once within a window
+            position = start
+            while position < stop:
+                offset = position % len(music)
+                end = min(stop, position + len(music) - offset)
+                track[position:end] += music[offset:offset + end - position] * window_gain[position - start:end - start]
+                position = end
+
+    track = track[:length]
+    np.clip(track, -1.0, 1.0, out=track)
+    return track
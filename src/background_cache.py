@@ -0,0 +1,127 @@
+import json
+import random
+import subprocess
+from pathlib import Path
+
+import ffmpeg_binaries
+from ffmpeg_render import probe_duration
+
+VIDEO_SUFFIXES = {".webm", ".mp4", ".mkv", ".mov"}
+
+
+def _index_path(proxy_path: Path) -> Path:
+    return proxy_path.with_suffix(".json")
+
+
+def _keyframe_times(path: Path) -> list[float]:
+    result = subprocess.run(
+        [
+            ffmpeg_binaries.ffprobe(), "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+            "-show_entries", "frame=pts_time", "-of", "json", str(path),
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    frames = json.loads(result.stdout).get("frames", [])
+    return sorted(float(frame["pts_time"]) for frame in frames if "pts_time" in frame)
+
+
+def _is_current(index: dict, source: Path, size, fps: int) -> bool:
+    return (
+        index.get("source_mtime") == source.stat().st_mtime
+        and tuple(index.get("size", ())) == tuple(size)
+        and index.get("fps") == fps
+    )
+
+
+def build_proxy(source: Path, proxy_dir: Path, size=(1080, 1920), fps: int = 60, gop_seconds: float = 1.0) -> dict:
+    """
+    Transcodes a background once into a 9:16 proxy at the output size and frame rate,
+    with a keyframe every `gop_seconds` so any window start is a cheap seek. Writes
+    a small index (duration, keyframe timestamps) next to the proxy and returns it.
+    Sources whose proxy is already current are not touched.
+    """
+    proxy_dir.mkdir(parents=True, exist_ok=True)
+    proxy_path = proxy_dir / f"{source.stem}_{size[0]}x{size[1]}_{fps}.mp4"
+    index_path = _index_path(proxy_path)
+
+    if proxy_path.exists() and index_path.exists():
+        index = json.loads(index_path.read_text())
+        if _is_current(index, source, size, fps):
+            return index
+
+    width, height = size
+    gop = max(1, round(fps * gop_seconds))
+    subprocess.run(
+        [
+            ffmpeg_binaries.ffmpeg(), "-y", "-loglevel", "error", "-i", str(source),
+            "-vf", f"crop=ih*9/16:ih,scale={width}:{height},setsar=1,fps={fps}",
+            "-an",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            "-movflags", "+faststart",
+            str(proxy_path),
+        ],
+        check=True,
+    )
+
+    keyframes = _keyframe_times(proxy_path)
+    index = {
+        "source": str(source),
+        "source_mtime": source.stat().st_mtime,
+        "proxy": str(proxy_path),
+        "size": list(size),
+        "fps": fps,
+        "duration": probe_duration(proxy_path),
+        "keyframes": keyframes or [0.0],
+    }
+    index_path.write_text(json.dumps(index))
+    return index
+
+
+def find_sources(*locations: Path) -> list[Path]:
+    """Background videos from the given files and directories."""
+    sources = []
+    for location in locations:
+        if location.is_dir():
+            sources.extend(sorted(p for p in location.iterdir() if p.suffix.lower() in VIDEO_SUFFIXES))
+        elif location.exists():
+            sources.append(location)
+    return sources
+
+
+def prepare_pool(sources, proxy_dir: Path, size=(1080, 1920), fps: int = 60) -> list[dict]:
+    """Builds (or reuses) a proxy for every source and returns their indexes."""
+    pool = [build_proxy(source, proxy_dir, size, fps) for source in sources]
+    if not pool:
+        raise FileNotFoundError("No background videos found.")
+    return pool
+
+
+def load_pool(proxy_dir: Path, size=(1080, 1920), fps: int = 60) -> list[dict]:
+    """Reads the proxy indexes written by prepare_pool without touching any video."""
+    pool = []
+    for index_path in sorted(proxy_dir.glob(f"*_{size[0]}x{size[1]}_{fps}.json")):
+        index = json.loads(index_path.read_text())
+        if Path(index["proxy"]).exists():
+            pool.append(index)
+    if not pool:
+        raise FileNotFoundError(f"No background proxies in {proxy_dir}; run prepare_pool first.")
+    return pool
+
+
+def pick_window(pool: list[dict], total_duration: float, rng=random):
+    """
+    Chooses a background and a keyframe-aligned start for a window of total_duration.
+    Prefers backgrounds long enough to cover the window; if none are, returns a start
+    of None and the caller loops the video.
+    """
+    long_enough = [index for index in pool if index["duration"] >= total_duration + 0.1]
+    if not long_enough:
+        return rng.choice(pool), None
+
+    index = rng.choice(long_enough)
+    latest_start = index["duration"] - total_duration
+    starts = [t for t in index["keyframes"] if t <= latest_start] or [0.0]
+    return index, rng.choice(starts)
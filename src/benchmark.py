@@ -0,0 +1,379 @@
+"""
+End-to-end benchmark on synthetic fixtures, with no network and no private assets.
+
+Generates a procedural background clip, tone-burst voice tracks with matching canned
+transcripts, a music bed and a logo, and serves Reddit and TTS from local stub
+servers. Each post length is then run through the stages of the pipeline, timing
+each one, and the results go out as JSON to keep as a regression baseline:
+
+    python benchmark.py --words 50 200 800 --output ../data/benchmarks/baseline.json
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import audio
+import ffmpeg_binaries
+
+SAMPLE_RATE = 44100
+VOCABULARY = (
+    "so my roommate and I have been friends since college but last week she told me that "
+    "her boyfriend would move in without asking anyone and honestly I lost it because the "
+    "lease is in my name and rent was already late twice this year"
+).split()
+
+
+# ---------- Fixtures ----------
+
+def write_wav(path: Path, samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Path:
+    """Mono or (samples, channels) float audio as 16-bit PCM WAV."""
+    samples = samples.reshape(len(samples), -1)
+    with wave.open(str(path), "wb") as file:
+        file.setnchannels(samples.shape[1])
+        file.setsampwidth(2)
+        file.setframerate(sample_rate)
+        file.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+    return path
+
+
+def make_post(words: int, rng: random.Random) -> tuple[str, str]:
+    """A title and a body of `words` words, in sentences of 6-18 words."""
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(6, 18))
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "?", "!"]))
+        remaining -= length
+    title = "AITA for " + " ".join(rng.choice(VOCABULARY) for _ in range(10)) + "?"
+    return title, " ".join(sentences)
+
+
+def synthesize_speech(text: str, rng: random.Random, sample_rate: int = SAMPLE_RATE) -> tuple[np.ndarray, dict]:
+    """
+    A voice-like track for `text`: one enveloped tone burst per word, short gaps between
+    words and longer ones after punctuation. Returns the samples and the transcript that
+    exactly matches them, shaped like whisper_timestamped's output.
+    """
+    pieces = []
+    segments = []
+    words = []
+    t = 0.0
+    for word in text.split():
+        length = 0.1 + 0.055 * len(word)
+        n = int(length * sample_rate)
+        phase = np.arange(n) / sample_rate
+        tone = np.sin(2 * np.pi * rng.uniform(110, 240) * phase) + 0.3 * np.sin(2 * np.pi * rng.uniform(600, 1200) * phase)
+        burst = (0.35 * tone + 0.02 * np.random.default_rng(rng.randrange(1 << 30)).standard_normal(n)) * np.hanning(n)
+        pieces.append(burst.astype(np.float32))
+        words.append({"text": word, "start": round(t, 3), "end": round(t + length, 3), "confidence": 1.0})
+        t += length
+
+        gap = 0.35 if word[-1] in ".,!?" else 0.06
+        pieces.append(np.zeros(int(gap * sample_rate), dtype=np.float32))
+        t += gap
+        if word[-1] in ".!?":
+            segments.append({
+                "text": " ".join(w["text"] for w in words), "start": words[0]["start"], "end": words[-1]["end"], "words": words,
+            })
+            words = []
+    if words:
+        segments.append({"text": " ".join(w["text"] for w in words), "start": words[0]["start"], "end": words[-1]["end"], "words": words})
+    return np.concatenate(pieces), {"text": text, "segments": segments, "language": "en"}
+
+
+def make_background(path: Path, duration: float = 60.0) -> Path:
+    """A moving landscape test pattern, standing in for the gameplay footage."""
+    subprocess.run(
+        [
+            ffmpeg_binaries.ffmpeg(), "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size=1920x1080:rate=30:duration={duration}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", str(path),
+        ],
+        check=True,
+    )
+    return path
+
+
+def make_music(path: Path, duration: float = 20.0) -> Path:
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    chord = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6)) / 6
+    return write_wav(path, np.stack([chord, chord], axis=1).astype(np.float32))
+
+
+def make_logo(path: Path) -> Path:
+    logo = Image.new("RGBA", (400, 120), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.rounded_rectangle((0, 0, 399, 119), radius=30, fill=(255, 69, 0, 255))
+    draw.text((30, 45), "r/benchmark", fill=(255, 255, 255, 255))
+    logo.save(path)
+    return path
+
+
+def make_tts_chunk(path: Path) -> bytes:
+    """A short MP3 the stub TTS server returns for every chunk; MP3 frames concatenate cleanly."""
+    subprocess.run(
+        [
+            ffmpeg_binaries.ffmpeg(), "-y", "-loglevel", "error", "-f", "lavfi", "-i", "sine=frequency=180:duration=1",
+            "-c:a", "libmp3lame", "-b:a", "64k", str(path),
+        ],
+        check=True,
+    )
+    return path.read_bytes()
+
+
+# ---------- Stub servers ----------
+
+def serve(handler) -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def _reply(self, payload) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def tts_stub(chunk_audio: bytes, latency: float):
+    """Answers every POST like the weilnet endpoint does, after `latency` seconds."""
+    encoded = base64.b64encode(chunk_audio).decode()
+
+    class Handler(_StubHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self._reply({"data": encoded})
+
+    return Handler
+
+
+def reddit_stub(posts: dict, latency: float):
+    """The two Reddit endpoints praw needs for a read-only submission fetch."""
+
+    class Handler(_StubHandler):
+        def do_POST(self):
+            # /api/v1/access_token, application-only OAuth
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._reply({"access_token": "benchmark", "token_type": "bearer", "expires_in": 3600, "scope": "*"})
+
+        def do_GET(self):
+            # /comments/<id>/
+            submission_id = self.path.split("/")[2]
+            title, body = posts[submission_id]
+            time.sleep(latency)
+            self._reply([
+                {"kind": "Listing", "data": {"children": [{"kind": "t3", "data": {
+                    "id": submission_id, "name": f"t3_{submission_id}", "title": title, "selftext": body,
+                    "subreddit": "benchmark", "score": 1000,
+                    "permalink": f"/r/benchmark/comments/{submission_id}/benchmark/",
+                }}], "after": None}},
+                {"kind": "Listing", "data": {"children": [], "after": None}},
+            ])
+
+    return Handler
+
+
+# ---------- Measurements ----------
+
+def peak_rss_mb() -> tuple[float, float]:
+    """Peak resident memory of this process and of its largest child (ffmpeg, render workers), in MB."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return round(own, 1), round(children, 1)
+
+
+class Timings(dict):
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[name] = round(time.perf_counter() - start, 4)
+
+
+def run_length(main, words: int, fixtures: dict, work_dir: Path, mode: str, renderers, composite_frames: int,
+               rng: random.Random, segment_workers: int = 1) -> dict:
+    from fetch_data import fetch_submission
+    from tiktokvoice import tts
+    from transcription import align_text
+
+    settings = main.RENDER_MODES[mode]
+    fps = settings["fps"]
+    submission_id = f"bench{words}"
+    title, body = fixtures["posts"][submission_id]
+    timings = Timings()
+
+    with timings.stage("fetch"):
+        fetch_submission(f"https://www.reddit.com/r/benchmark/comments/{submission_id}/benchmark/", ttl=0)
+    with timings.stage("tts"):
+        tts(body, main.TTS_VOICE, str(work_dir / f"tts_{submission_id}.mp3"), client=fixtures["tts_client"])
+
+    voice1, _ = synthesize_speech(title, rng)
+    voice2, transcript = synthesize_speech(body, rng)
+    voice1_path = write_wav(work_dir / f"voice1_{submission_id}.wav", voice1)
+    voice2_path = write_wav(work_dir / f"voice2_{submission_id}.wav", voice2)
+
+    with timings.stage("title_card"):
+        title_card = main.create_box.render_title_card(main.censor_text(title), 20, fixtures["logo"])
+    with timings.stage("align"):
+        align_text(body, audio.decode(voice2_path, 16000, channels=1)[:, 0], 16000)
+
+    intro_duration = len(voice1) / SAMPLE_RATE
+    total_duration = (len(voice1) + len(voice2)) / SAMPLE_RATE + 2.0
+    with timings.stage("plan"):
+        plan = main.plan_video(transcript, title_card, intro_duration, total_duration, 0.1, mode)
+    with timings.stage("subtitles"):
+        # rasterize every word once, as the first frame showing it would
+        track = main._subtitle_track(plan)
+        for start, _, _ in track.events:
+            track.sprite_at(start)
+    with timings.stage("background_fit"):
+        main._fit_background_to_duration(total_duration, plan["background"], plan["background_start"]).close()
+
+    # Python-side compositing alone, without the encoder
+    frames = min(composite_frames, int(total_duration * fps))
+    clip = main.build_video_clip(plan)
+    with timings.stage("composite"):
+        for index in range(frames):
+            clip.get_frame(index * total_duration / frames)
+    clip.close()
+
+    encode_fps = {}
+    for renderer in renderers:
+        if renderer == "moviepy" and segment_workers <= 1 and main.STREAM_RENDER_SECONDS is not None \
+                and total_duration > main.STREAM_RENDER_SECONDS:
+            # create_tiktok_clip streams long videos through ffmpeg regardless
+            continue
+        output_path = work_dir / f"{submission_id}_{renderer}.mp4"
+        with timings.stage(f"encode_{renderer}"):
+            main.create_tiktok_clip(
+                transcribed_text=transcript,
+                background_music_path=fixtures["music"],
+                voice1_path=voice1_path,
+                voice2_path=voice2_path,
+                title_card=title_card,
+                output_path=output_path,
+                animation_rate=0.1,
+                renderer=renderer,
+                segment_workers=segment_workers,
+                mode=mode,
+            )
+        encode_fps[renderer] = round(int(total_duration * fps) / timings[f"encode_{renderer}"], 2)
+
+    own_rss, child_rss = peak_rss_mb()
+    return {
+        "words": words,
+        "duration": round(total_duration, 2),
+        "frames": int(total_duration * fps),
+        "stages": dict(timings),
+        "composite_fps": round(frames / timings["composite"], 2) if frames else None,
+        "encode_fps": encode_fps,
+        "peak_rss_mb": own_rss,
+        "children_peak_rss_mb": child_rss,
+    }
+
+
+def run(word_counts, mode: str = "draft", renderers=("moviepy", "ffmpeg"), composite_frames: int = 300,
+        tts_latency: float = 0.05, reddit_latency: float = 0.05, seed: int = 0, keep: Path = None,
+        segment_workers: int = 1) -> dict:
+    rng = random.Random(seed)
+    work_dir = Path(tempfile.mkdtemp(prefix="tiktok_bench_"))
+    try:
+        posts = {f"bench{words}": make_post(words, rng) for words in word_counts}
+        _, tts_url = serve(tts_stub(make_tts_chunk(work_dir / "chunk.mp3"), tts_latency))
+        _, reddit_url = serve(reddit_stub(posts, reddit_latency))
+
+        # fetch_data and tiktokvoice read these at import, so main is imported only now
+        os.environ.update(
+            REDDIT_URL=reddit_url, REDDIT_OAUTH_URL=reddit_url,
+            REDDIT_CACHE_DIR=str(work_dir / "reddit"), TTS_CACHE_DIR=str(work_dir / "tts"),
+        )
+        import background_cache
+        import main
+        from tiktokvoice import TTSClient
+
+        settings = main.RENDER_MODES[mode]
+        main.BACKGROUND_PROXY_DIR = work_dir / "proxies"
+        fixture_timings = Timings()
+        with fixture_timings.stage("background_proxy"):
+            background_cache.prepare_pool(
+                [make_background(work_dir / "background.mp4")], main.BACKGROUND_PROXY_DIR, settings["size"], settings["fps"]
+            )
+        main._background_pool.cache_clear()
+
+        fixtures = {
+            "posts": posts,
+            "music": make_music(work_dir / "music.wav"),
+            "logo": make_logo(work_dir / "logo.png"),
+            "tts_client": TTSClient(endpoints=[{"url": tts_url, "response": "data"}]),
+        }
+        runs = [
+            run_length(main, words, fixtures, work_dir, mode, renderers, composite_frames, rng, segment_workers)
+            for words in word_counts
+        ]
+        fixtures["tts_client"].close()
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+            "mode": mode,
+            "settings": {"size": settings["size"], "fps": settings["fps"], "encoder": main.encoder.resolve(settings["encoder"])},
+            "fixtures": dict(fixture_timings),
+            "runs": runs,
+        }
+    finally:
+        if keep:
+            shutil.copytree(work_dir, keep, dirs_exist_ok=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the video pipeline on synthetic fixtures")
+    parser.add_argument("--words", type=int, nargs="+", default=[50, 200, 800], help="post body lengths to run")
+    parser.add_argument("--mode", default="draft", choices=["draft", "final"])
+    parser.add_argument("--renderers", nargs="+", default=["moviepy", "ffmpeg"], choices=["moviepy", "ffmpeg"])
+    parser.add_argument("--composite-frames", type=int, default=300, help="frames to composite for the composite FPS")
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="stub TTS response delay, seconds")
+    parser.add_argument("--reddit-latency", type=float, default=0.05, help="stub Reddit response delay, seconds")
+    parser.add_argument("--segment-workers", type=int, default=1, help="segmented moviepy render with this many workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", type=Path, help="copy the fixtures and rendered videos here")
+    parser.add_argument("--output", type=Path, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = run(
+        args.words, args.mode, args.renderers, args.composite_frames,
+        args.tts_latency, args.reddit_latency, args.seed, args.keep, args.segment_workers,
+    )
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Benchmark written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,64 @@
+"""
+Thin front end for the render daemon (daemon.py). It imports nothing heavy, so
+submitting work starts immediately; the daemon keeps the models and fonts warm.
+
+    python client.py https://www.reddit.com/r/.../comments/...
+    python client.py --urls-file nightly.txt --draft
+    python client.py            # interactive prompt
+"""
+import argparse
+import json
+import socket
+from pathlib import Path
+
+SOCKET_PATH = Path("../data/render.sock")
+
+
+def submit(entries: list[str], mode: str = "final", split_parts: bool = False, socket_path: Path = SOCKET_PATH,
+           encoder: str = None) -> dict:
+    """Sends post URLs (or r/<subreddit> entries) to the daemon and returns its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(str(socket_path))
+        conn.sendall(json.dumps({"entries": entries, "mode": mode, "split_parts": split_parts, "encoder": encoder}).encode() + b"\n")
+        reply = conn.makefile("rb").readline()
+    return json.loads(reply)
+
+
+def prompt_entries() -> list[str]:
+    entries = []
+    while True:
+        entry = input("Enter a Reddit post URL, or r/<subreddit> for its top posts (or 'done' to finish): ").strip()
+        if entry.lower() == "done":
+            break
+        if entry.startswith("https://www.reddit.com") or (entry.startswith("r/") and len(entry) > 2):
+            entries.append(entry)
+        else:
+            print("Invalid URL. Please enter a valid Reddit post URL.")
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Submit posts to the render daemon")
+    parser.add_argument("entries", nargs="*", help="post URLs or r/<subreddit>")
+    parser.add_argument("--urls-file", type=Path, help="read URLs from this file, one per line")
+    parser.add_argument("--draft", action="store_true", help="quick low-res preview render")
+    parser.add_argument("--parts", action="store_true", help="split long posts into Part 1/2/3 videos")
+    parser.add_argument("--encoder", help="encoder profile name, or 'auto' (see encoder.py)")
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH)
+    args = parser.parse_args()
+
+    entries = list(args.entries)
+    if args.urls_file:
+        lines = (line.strip() for line in args.urls_file.read_text().splitlines())
+        entries.extend(line for line in lines if line and not line.startswith("#"))
+    if not entries:
+        entries = prompt_entries()
+
+    if entries:
+        reply = submit(entries, "draft" if args.draft else "final", args.parts, args.socket, args.encoder)
+        if "error" in reply:
+            print(f"[ERROR] {reply['error']}")
+        else:
+            print(f"Queued {reply['queued']} videos.")
+    else:
+        print("No URLs provided. Exiting.")
@@ -1,40 +1,73 @@
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+from functools import lru_cache
 
-# Function to create an image with a rounded rectangle, text, and an overlayed PNG image at the top
-def create_text_image_with_overlay(text, font_size, overlay_image_path, output_path):
-    # Set the fixed width (slightly less than a TikTok video width of 1080px)
-    fixed_width = 500
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
 
-    # Load the overlay image
-    overlay_img = Image.open(overlay_image_path)
-    overlay_img = overlay_img.resize((fixed_width, overlay_img.height * fixed_width // overlay_img.width), Image.Resampling.LANCZOS)
-    overlay_height = overlay_img.height
+# Set the fixed width (slightly less than a TikTok video width of 1080px)
+FIXED_WIDTH = 500
+FONT_NAME = "Montserrat-ExtraBold"
 
-    # Load a font with the given font size
+
+@lru_cache(maxsize=8)
+def _load_font(font_name, font_size):
+    # Load a font with the given font size, once per process
     try:
-        font = ImageFont.truetype("Montserrat-ExtraBold", font_size)
+        return ImageFont.truetype(font_name, font_size)
     except IOError:
-        font = ImageFont.load_default()
         print("Default font is being used, and it may not respect the font size.")
+        return ImageFont.load_default()
 
-    # Calculate the wrapped text and its height
-    temp_img = Image.new('RGB', (fixed_width, 1))
-    draw = ImageDraw.Draw(temp_img)
+
+@lru_cache(maxsize=4)
+def _load_logo(overlay_image_path, width):
+    # Load and resize the overlay image, once per process
+    with Image.open(overlay_image_path) as overlay_img:
+        overlay_img = overlay_img.convert("RGBA")
+        return overlay_img.resize((width, overlay_img.height * width // overlay_img.width), Image.Resampling.LANCZOS)
+
+
+@lru_cache(maxsize=8192)
+def _advance(font_name, font_size, word):
+    # Horizontal advance of a word; titles reuse the same words constantly
+    return _load_font(font_name, font_size).getlength(word)
+
+
+def _wrap(text, font_name, font_size, max_width):
     lines = []
-    words = text.split()
-    line = ""
+    line = []
+    line_width = 0.0
+    space = _advance(font_name, font_size, " ")
 
-    for word in words:
-        # Check if the current line with the next word would exceed the fixed width
-        if draw.textlength(line + word, font=font) <= fixed_width - 4:  # 4 pixels for left and right padding
-            line += word + " "
+    for word in text.split():
+        width = _advance(font_name, font_size, word)
+        # Check if the current line with the next word would exceed the width
+        if not line or line_width + width <= max_width:
+            line.append(word)
+            line_width += width + space
         else:
-            lines.append(line.strip())
-            line = word + " "
-    lines.append(line.strip())
+            lines.append(" ".join(line))
+            line = [word]
+            line_width = width + space
+    lines.append(" ".join(line))
+    return lines
+
+
+def render_title_card(text, font_size, overlay_image_path, corner_radius=20, font_name=FONT_NAME):
+    """
+    Title card as an RGBA array: the logo on top of a rounded rectangle holding the
+    wrapped text. Font, resized logo and word widths are cached per process, and
+    nothing touches the disk, so concurrent jobs can't step on each other.
+    """
+    font = _load_font(font_name, font_size)
+    overlay_img = _load_logo(str(overlay_image_path), FIXED_WIDTH)
+    overlay_height = overlay_img.height
 
-    # Calculate text height
-    text_height = sum([draw.textbbox((0, 0), line, font=font)[3] - draw.textbbox((0, 0), line, font=font)[1] for line in lines])
+    # Calculate the wrapped text and its height
+    lines = _wrap(text, font_name, font_size, FIXED_WIDTH - 4)  # 4 pixels for left and right padding
+    line_heights = []
+    for line in lines:
+        _, top, _, bottom = font.getbbox(line)
+        line_heights.append(bottom - top)
 
     # Define the specific padding values
     left_right_padding = 8
@@ -42,17 +75,10 @@ def create_text_image_with_overlay(text, font_size, overlay_image_path, output_p
     bottom_padding = 20
 
     # Adjust height to include overlay image and text
-    height = text_height + top_padding + bottom_padding + overlay_height
+    height = sum(line_heights) + top_padding + bottom_padding + overlay_height
 
     # Create a new image with calculated height and fixed width
-    img = Image.new('RGBA', (fixed_width, height), color=(245, 245, 245, 255))
-
-    # Create a rounded rectangle
-    radius = 15
-    rounded_rect = Image.new('L', (fixed_width, height), 0)
-    draw_rounded = ImageDraw.Draw(rounded_rect)
-    draw_rounded.rounded_rectangle([(0, 0), (fixed_width, height)], radius, fill=255)
-    img.putalpha(rounded_rect)
+    img = Image.new('RGBA', (FIXED_WIDTH, height), color=(245, 245, 245, 255))
 
     # Paste the overlay image at the top of the rectangle
     img.paste(overlay_img, (0, 0), overlay_img)
@@ -60,11 +86,20 @@ def create_text_image_with_overlay(text, font_size, overlay_image_path, output_p
     # Draw the text onto the image below the overlay
     draw = ImageDraw.Draw(img)
     text_position_y = overlay_height + top_padding
-    for line in lines:
+    for line, line_height in zip(lines, line_heights):
         draw.text((left_right_padding, text_position_y), line, font=font, fill=(0, 0, 0, 255))
-        line_height = draw.textbbox((0, 0), line, font=font)[3] - draw.textbbox((0, 0), line, font=font)[1]
         text_position_y += line_height
 
-    # Save the image
-    img.save(output_path)
-    return (output_path, height)
+    # Round the corners
+    rounded_rect = Image.new('L', (FIXED_WIDTH, height), 0)
+    ImageDraw.Draw(rounded_rect).rounded_rectangle([(0, 0), (FIXED_WIDTH, height)], corner_radius, fill=255)
+    img.putalpha(rounded_rect)
+
+    return np.asarray(img)
+
+
+# Function to create an image with a rounded rectangle, text, and an overlayed PNG image at the top
+def create_text_image_with_overlay(text, font_size, overlay_image_path, output_path):
+    card = render_title_card(text, font_size, overlay_image_path)
+    Image.fromarray(card).save(output_path)
+    return (output_path, card.shape[0])
@@ -0,0 +1,102 @@
+"""
+Long-running render daemon. Loads the Whisper model, fonts and render workers once,
+then takes jobs from client.py over a local Unix socket and feeds them into one
+pipeline that stays up between submissions.
+
+    python daemon.py
+"""
+import argparse
+import json
+import signal
+import socketserver
+import threading
+from pathlib import Path
+
+import client
+import encoder
+import main
+
+
+class RenderDaemon:
+    def __init__(self, socket_path: Path = client.SOCKET_PATH):
+        self.socket_path = Path(socket_path)
+        self.transcribe_stage = main.TranscribeStage()
+        # jobs are reported as they finish; holding on to them would grow without bound
+        self.pipeline = main.build_pipeline(self.transcribe_stage, collect_results=False)
+        self._prepared_modes = set()
+        self._prepare_lock = threading.Lock()
+        self.server = None
+
+    def _prepare(self, mode: str) -> None:
+        with self._prepare_lock:
+            if mode not in self._prepared_modes:
+                main.prepare_backgrounds(mode)
+                self._prepared_modes.add(mode)
+
+    def warm_up(self) -> None:
+        self.pipeline.start()  # spawns the render workers, which warm themselves up
+        self._prepare("final")
+        self.transcribe_stage.transcriber.load_model()
+
+    def submit(self, entries: list[str], mode: str) -> list[str]:
+        if mode not in main.RENDER_MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        urls = [url for entry in entries for url in main.expand_entry(entry)]
+        self._prepare(mode)
+        return urls
+
+    def serve_forever(self) -> None:
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline())
+                    mode = request.get("mode", "final")
+                    split_parts = bool(request.get("split_parts", False))
+                    encoder_name = request.get("encoder")
+                    if encoder_name not in (None, "auto", *encoder.ENCODER_PROFILES):
+                        raise ValueError(f"Unknown encoder profile: {encoder_name}")
+                    urls = daemon.submit(request["entries"], mode)
+                except Exception as e:
+                    self.wfile.write(json.dumps({"error": str(e)}).encode() + b"\n")
+                    return
+                # reply first: the client shouldn't wait on pipeline backpressure
+                self.wfile.write(json.dumps({"queued": len(urls)}).encode() + b"\n")
+                self.wfile.flush()
+                for url in urls:
+                    daemon.pipeline.submit({"url": url, "mode": mode, "split_parts": split_parts, "encoder": encoder_name})
+
+        self.socket_path.unlink(missing_ok=True)
+        self.server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), Handler)
+        self.server.daemon_threads = True
+        print(f"Render daemon listening on {self.socket_path}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+
+    def shutdown(self) -> None:
+        if self.server:
+            # shutdown() blocks until serve_forever returns, so it can't run on that thread
+            threading.Thread(target=self.server.shutdown).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TikTok video render daemon")
+    parser.add_argument("--socket", type=Path, default=client.SOCKET_PATH)
+    args = parser.parse_args()
+
+    render_daemon = RenderDaemon(args.socket)
+    render_daemon.warm_up()
+    signal.signal(signal.SIGTERM, lambda *_: render_daemon.shutdown())
+    try:
+        render_daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    print("Finishing queued jobs...")
+    render_daemon.pipeline.close()
+    render_daemon.pipeline.join()
+    print(render_daemon.pipeline.report())
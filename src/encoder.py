@@ -0,0 +1,194 @@
+"""
+Named x264/AAC encoder profiles, and an autotuner that measures them on this machine.
+
+    python encoder.py                  # autotune with the default quality floor
+    python encoder.py --min-ssim 0.98 --seconds 8
+
+The autotuner encodes the same short synthetic clip with every candidate profile,
+scores each encode against the lossless source with SSIM and PSNR, and records the
+fastest profile that meets the quality floor for this host. Renders configured
+with the "auto" encoder use that pick.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import ffmpeg_binaries
+
+# threads 0 lets x264 choose; tune None leaves it unset
+ENCODER_PROFILES = {
+    "quality": {"preset": "slow", "crf": 18, "threads": 0, "tune": "film", "pix_fmt": "yuv420p", "audio_bitrate": "192k"},
+    "balanced": {"preset": "medium", "crf": 20, "threads": 0, "tune": None, "pix_fmt": "yuv420p", "audio_bitrate": "192k"},
+    "fast": {"preset": "veryfast", "crf": 21, "threads": 0, "tune": None, "pix_fmt": "yuv420p", "audio_bitrate": "160k"},
+    "faster": {"preset": "superfast", "crf": 22, "threads": 0, "tune": None, "pix_fmt": "yuv420p", "audio_bitrate": "160k"},
+    "draft": {"preset": "ultrafast", "crf": 28, "threads": 0, "tune": "fastdecode", "pix_fmt": "yuv420p", "audio_bitrate": "96k"},
+}
+DEFAULT_PROFILE = "balanced"
+
+AUTOTUNE_PATH = Path(os.environ.get("ENCODER_AUTOTUNE_PATH", "../data/cache/encoder_autotune.json"))
+MIN_SSIM = 0.97
+
+
+def video_args(profile: dict) -> list[str]:
+    args = ["-c:v", "libx264", "-preset", profile["preset"], "-crf", str(profile["crf"]), "-pix_fmt", profile["pix_fmt"]]
+    if profile.get("tune"):
+        args += ["-tune", profile["tune"]]
+    if profile.get("threads"):
+        args += ["-threads", str(profile["threads"])]
+    return args
+
+
+def audio_args(profile: dict) -> list[str]:
+    return ["-c:a", "aac", "-b:a", profile["audio_bitrate"]]
+
+
+def moviepy_kwargs(profile: dict, audio: bool = True) -> dict:
+    """write_videofile arguments for a profile. moviepy always encodes even-sized libx264 as yuv420p."""
+    params = ["-crf", str(profile["crf"])]
+    if profile.get("tune"):
+        params += ["-tune", profile["tune"]]
+    kwargs = {"codec": "libx264", "preset": profile["preset"], "threads": profile.get("threads") or None, "ffmpeg_params": params}
+    if audio:
+        kwargs["audio_bitrate"] = profile["audio_bitrate"]
+    else:
+        kwargs["audio"] = False
+    return kwargs
+
+
+def _hosts() -> dict:
+    try:
+        return json.loads(AUTOTUNE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def tuned_profile(host: str = None):
+    """This host's autotuned profile name, or None if it was never tuned (or the profile is gone)."""
+    entry = _hosts().get(host or socket.gethostname())
+    if entry and entry["profile"] in ENCODER_PROFILES:
+        return entry["profile"]
+    return None
+
+
+def resolve(name: str = None) -> dict:
+    """Profile settings by name; "auto" or None means this host's tuned pick, else DEFAULT_PROFILE."""
+    if name in (None, "auto"):
+        name = tuned_profile() or DEFAULT_PROFILE
+    return dict(ENCODER_PROFILES[name], name=name)
+
+
+def make_reference(path: Path, size, fps: int, seconds: float) -> Path:
+    """
+    Lossless synthetic source: a moving test pattern with per-frame grain, which is
+    about as hard on the encoder as the gameplay backgrounds, plus a subtitle-sized
+    text box so sharp edges are scored too.
+    """
+    width, height = size
+    subprocess.run(
+        [
+            ffmpeg_binaries.ffmpeg(), "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={seconds}",
+            "-vf", "noise=alls=14:allf=t,drawbox=x=iw/8:y=ih/2-ih/20:w=iw*3/4:h=ih/10:color=white@0.9:t=fill",
+            "-c:v", "libx264", "-qp", "0", "-preset", "ultrafast", "-pix_fmt", "yuv420p", str(path),
+        ],
+        check=True,
+    )
+    return path
+
+
+def measure_quality(distorted: Path, reference: Path) -> tuple[float, float]:
+    """(SSIM, PSNR in dB) of an encode against its reference, averaged over all frames."""
+    result = subprocess.run(
+        [
+            ffmpeg_binaries.ffmpeg(), "-nostats", "-i", str(distorted), "-i", str(reference),
+            "-lavfi", "[0:v]split[d1][d2];[1:v]split[r1][r2];[d1][r1]ssim;[d2][r2]psnr",
+            "-f", "null", "-",
+        ],
+        capture_output=True, text=True, check=True,
+    )
+    ssim = float(re.search(r"SSIM .*All:([\d.]+)", result.stderr).group(1))
+    psnr = re.search(r"PSNR .*average:([\d.]+|inf)", result.stderr).group(1)
+    return ssim, float(psnr)
+
+
+def benchmark_profile(name: str, reference: Path, output_path: Path, frames: int) -> dict:
+    profile = ENCODER_PROFILES[name]
+    start = time.perf_counter()
+    subprocess.run(
+        [ffmpeg_binaries.ffmpeg(), "-y", "-loglevel", "error", "-i", str(reference), *video_args(profile), str(output_path)],
+        check=True,
+    )
+    seconds = time.perf_counter() - start
+    ssim, psnr = measure_quality(output_path, reference)
+    return {
+        "profile": name,
+        "encode_seconds": round(seconds, 3),
+        "fps": round(frames / seconds, 2),
+        "bytes": output_path.stat().st_size,
+        "ssim": round(ssim, 5),
+        "psnr": round(psnr, 2),
+    }
+
+
+def autotune(candidates=None, size=(1080, 1920), fps: int = 60, seconds: float = 5.0, min_ssim: float = MIN_SSIM,
+             min_psnr: float = None) -> dict:
+    """
+    Measures every candidate on this host and saves the fastest one meeting the
+    quality floor to AUTOTUNE_PATH. Only the video encode is timed; the audio
+    settings come along with the chosen profile.
+    """
+    candidates = list(candidates or ENCODER_PROFILES)
+    with tempfile.TemporaryDirectory(prefix="encoder_autotune_") as work_dir:
+        reference = make_reference(Path(work_dir) / "reference.mkv", size, fps, seconds)
+        results = []
+        for name in candidates:
+            result = benchmark_profile(name, reference, Path(work_dir) / f"{name}.mp4", int(seconds * fps))
+            print(f"{name:<10}{result['fps']:>8.1f} fps{result['bytes'] / 1e6:>8.2f} MB"
+                  f"  SSIM {result['ssim']:.4f}  PSNR {result['psnr']:.2f} dB")
+            results.append(result)
+
+    passing = [
+        r for r in results if r["ssim"] >= min_ssim and (min_psnr is None or r["psnr"] >= min_psnr)
+    ]
+    # most quality-preserving candidate if nothing meets the floor
+    chosen = max(passing, key=lambda r: r["fps"]) if passing else max(results, key=lambda r: r["ssim"])
+    entry = {
+        "profile": chosen["profile"],
+        "meets_floor": bool(passing),
+        "min_ssim": min_ssim,
+        "min_psnr": min_psnr,
+        "size": list(size),
+        "fps": fps,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    hosts = _hosts()
+    hosts[socket.gethostname()] = entry
+    AUTOTUNE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = AUTOTUNE_PATH.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(hosts, indent=2))
+    tmp_path.replace(AUTOTUNE_PATH)
+    return entry
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick the fastest encoder profile that meets a quality floor on this host")
+    parser.add_argument("--candidates", nargs="+", choices=list(ENCODER_PROFILES), help="profiles to try (default: all)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of the synthetic test clip")
+    parser.add_argument("--size", type=int, nargs=2, default=[1080, 1920], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--min-ssim", type=float, default=MIN_SSIM)
+    parser.add_argument("--min-psnr", type=float, help="optional PSNR floor in dB")
+    args = parser.parse_args()
+
+    entry = autotune(args.candidates, tuple(args.size), args.fps, args.seconds, args.min_ssim, args.min_psnr)
+    if entry["meets_floor"]:
+        print(f"Selected '{entry['profile']}' for {socket.gethostname()} (saved to {AUTOTUNE_PATH}).")
+    else:
+        print(f"No profile met the quality floor; using the best-quality one, '{entry['profile']}'.")
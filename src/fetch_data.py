@@ -1,22 +1,95 @@
+import json
+import os
+import time
+from collections import namedtuple
+from pathlib import Path
+
 import praw
+from praw.models import Submission as RedditSubmission
+
+# Point these at a local fake of the Reddit API for testing
+REDDIT_URL = os.environ.get("REDDIT_URL", "https://www.reddit.com")
+REDDIT_OAUTH_URL = os.environ.get("REDDIT_OAUTH_URL", "https://oauth.reddit.com")
+
+CACHE_DIR = Path(os.environ.get("REDDIT_CACHE_DIR", "../data/cache/reddit"))
+CACHE_TTL = int(os.environ.get("REDDIT_CACHE_TTL", 6 * 60 * 60))  # seconds
 
 # Reddit API credentials
 reddit = praw.Reddit(
     client_id="E_D2zCfnX2FMMQoB9wlDPw",
     client_secret="Dwz72QR2tmyL0NgOmArU7vXEYyK_-w",
     user_agent="linux:com.example.greentext:v1 (by /u/NigwardTesticles)",
+    reddit_url=REDDIT_URL,
+    oauth_url=REDDIT_OAUTH_URL,
 )
 
+# Everything the video pipeline needs from a post, fetched in one request
+Submission = namedtuple("Submission", ["id", "title", "selftext", "subreddit", "score", "url"])
+
+
+def _cache_path(submission_id: str) -> Path:
+    return CACHE_DIR / f"{submission_id}.json"
+
+
+def _cache_get(submission_id: str, ttl: float):
+    path = _cache_path(submission_id)
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if time.time() - data.pop("fetched_at", 0) > ttl:
+        return None
+    return Submission(**data)
+
+
+def _cache_put(record: Submission) -> None:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _cache_path(record.id)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({**record._asdict(), "fetched_at": time.time()}))
+    tmp_path.replace(path)
+
+
+def _record(submission) -> Submission:
+    # touching the first attribute triggers the single fetch; the rest come from that response
+    return Submission(
+        id=submission.id,
+        title=submission.title,
+        selftext=submission.selftext,
+        subreddit=submission.subreddit.display_name,
+        score=submission.score,
+        url=f"https://www.reddit.com{submission.permalink}",
+    )
+
+
+def fetch_submission(url: str, ttl: float = CACHE_TTL, client: praw.Reddit = None) -> Submission:
+    """One post as an immutable record, from the on-disk cache if younger than ttl, else one API request."""
+    submission_id = RedditSubmission.id_from_url(url)
+    record = _cache_get(submission_id, ttl)
+    if record is None:
+        record = _record((client or reddit).submission(id=submission_id))
+        _cache_put(record)
+    return record
+
+
+def fetch_top(subreddit: str, limit: int = 100, time_filter: str = "day", client: praw.Reddit = None) -> list[Submission]:
+    """
+    Top posts of a subreddit. praw pages the listing 100 posts per request, and
+    listing entries are complete, so no post costs a request of its own. Every
+    record is cached for later fetch_submission calls.
+    """
+    listing = (client or reddit).subreddit(subreddit).top(time_filter=time_filter, limit=limit)
+    records = [_record(submission) for submission in listing]
+    for record in records:
+        _cache_put(record)
+    return records
+
 
 def getSubmissionTitle(url):
-    submission_id = reddit.submission(url=url).id
-    title = reddit.submission(submission_id).title
-    return title
+    return fetch_submission(url).title
 
 def getSubmissionBody(url):
-    submission_id = reddit.submission(url=url).id
-    body = reddit.submission(submission_id).selftext
-    return body
+    return fetch_submission(url).selftext
 
 def getSubmissionID(url):
-    return reddit.submission(url=url).id
+    return fetch_submission(url).id
@@ -0,0 +1,18 @@
+"""
+Where the ffmpeg and ffprobe executables are. They are looked up each time a command
+is built, not at import, so FFMPEG_BINARY set by main.py's config (which moviepy
+reads too) applies to every module however early it was imported.
+"""
+import os
+
+
+def ffmpeg() -> str:
+    return os.environ.get("FFMPEG_BINARY") or "ffmpeg"
+
+
+def ffprobe() -> str:
+    """FFPROBE_BINARY if set, else the ffprobe next to a configured ffmpeg, else the one on PATH."""
+    if os.environ.get("FFPROBE_BINARY"):
+        return os.environ["FFPROBE_BINARY"]
+    sibling = os.path.join(os.path.dirname(ffmpeg()), "ffprobe")
+    return sibling if os.path.dirname(sibling) and os.path.exists(sibling) else "ffprobe"
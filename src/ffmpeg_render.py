@@ -0,0 +1,257 @@
+import json
+import os
+import subprocess
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import encoder
+import ffmpeg_binaries
+import tracing
+from animation import ScaleAnimation
+from subtitles import SubtitleTrack, blit_rgba
+
+def probe_duration(path: Path) -> float:
+    """Container duration in seconds, read by ffprobe without decoding anything."""
+    result = subprocess.run(
+        [ffmpeg_binaries.ffprobe(), "-v", "error", "-show_entries", "format=duration", "-of", "json", str(path)],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+
+class OverlayLayer:
+    """
+    The sparse part of the video: the title card during the intro, then the active
+    subtitle word. Frames are RGBA on a transparent band `size` pixels large that
+    ffmpeg overlays on the vertical center of the background.
+    """
+
+    def __init__(self, size, title_card: np.ndarray, intro_duration: float, subtitle_track: SubtitleTrack,
+                 animation_rate: float, fps: int = 60):
+        self.size = size
+        self.title_card = ScaleAnimation(title_card, lambda t: 0.95 + 0.05 * min(1, t / animation_rate), animation_rate, fps)
+        self.intro_duration = intro_duration
+        self.subtitle_track = subtitle_track
+        self._blank = np.zeros((size[1], size[0], 4), dtype=np.uint8)
+        self._blank.setflags(write=False)
+        # sprites are cached bitmaps, so an unchanged sprite means an unchanged frame
+        self._last_sprite = None
+        self._last_frame = self._blank
+
+    def frame(self, t: float) -> np.ndarray:
+        if t < self.intro_duration:
+            sprite = self.title_card.frame(t)
+        else:
+            sprite = self.subtitle_track.sprite_at(t - self.intro_duration)
+        if sprite is None:
+            return self._blank
+        if sprite is not self._last_sprite:
+            self._last_sprite = sprite
+            self._last_frame = blit_rgba(self._blank, sprite)
+        return self._last_frame
+
+
+def overlay_frames(layer: OverlayLayer, total_duration: float, fps: int, sampler: tracing.FrameSampler = None):
+    """
+    Lazily yields the overlay frames in order. Nothing is built ahead of the frame
+    being encoded, so memory doesn't grow with the length of the video.
+    """
+    for index in range(int(total_duration * fps)):
+        yield sampler.frame(layer.frame, index / fps) if sampler else layer.frame(index / fps)
+    if sampler:
+        sampler.close()
+
+
+def rendition_graph(source: str, size, fps: int, renditions) -> tuple[list[str], list[str]]:
+    """
+    Filters fanning the composited master stream `source` out to every rendition:
+    split once, then center-crop to the rendition's aspect ratio, scale and drop
+    frames down to its rate. Returns the filters and one output label per rendition.
+    """
+    if len(renditions) == 1 and tuple(renditions[0]["size"]) == tuple(size) and renditions[0]["fps"] >= fps:
+        return [], [source]
+    width, height = size
+    labels = [f"[r{i}]" for i in range(len(renditions))]
+    filters = [f"{source}split={len(renditions)}" + "".join(f"[m{i}]" for i in range(len(renditions)))]
+    for i, rendition in enumerate(renditions):
+        out_w, out_h = rendition["size"]
+        chain = []
+        if out_w * height > out_h * width:
+            chain.append(f"crop={width}:{width * out_h // out_w // 2 * 2}")
+        elif out_w * height < out_h * width:
+            chain.append(f"crop={height * out_w // out_h // 2 * 2}:{height}")
+        if (out_w, out_h) != (width, height):
+            chain.append(f"scale={out_w}:{out_h}")
+        if rendition["fps"] < fps:
+            chain.append(f"fps={rendition['fps']}")
+        filters.append(f"[m{i}]{','.join(chain) or 'null'}{labels[i]}")
+    return filters, labels
+
+
+def output_args(video_label: str, audio_map: str, rendition: dict, total_duration: float) -> list[str]:
+    profile = rendition.get("encoder") or encoder.ENCODER_PROFILES[encoder.DEFAULT_PROFILE]
+    return [
+        "-map", video_label, "-map", audio_map,
+        "-t", f"{total_duration:.3f}",
+        *encoder.video_args(profile),
+        *encoder.audio_args(profile),
+        str(rendition["path"]),
+    ]
+
+
+def build_command(
+    background_path: Path,
+    background_start: float,
+    audio_fd: int,
+    output_path: Path,
+    size,
+    overlay_size,
+    fps: int,
+    total_duration: float,
+    sample_rate: int,
+    channels: int,
+    encoder_profile: dict = None,
+    renditions=None,
+) -> list[str]:
+    """
+    The ffmpeg command for render_video. `renditions` (dicts with path, size, fps and
+    encoder profile) replaces the single output_path: the frame is still composited once at
+    `size` and `fps`, and each rendition only adds its scaler and encoder.
+    """
+    width, height = size
+    overlay_w, overlay_h = overlay_size
+    if renditions is None:
+        renditions = [{"path": output_path, "size": size, "fps": fps, "encoder": encoder_profile}]
+    fan_out, labels = rendition_graph("[v]", size, fps, renditions)
+    filter_graph = ";".join(
+        [
+            # background: crop to 9:16 around the center, scale to the output size, resample to fps
+            f"[0:v]crop=ih*9/16:ih,scale={width}:{height},setsar=1,fps={fps}[bg]",
+            f"[bg][1:v]overlay=({width}-{overlay_w})/2:({height}-{overlay_h})/2:format=auto[v]",
+        ] + fan_out
+    )
+    command = [
+        ffmpeg_binaries.ffmpeg(), "-y", "-loglevel", "error",
+        "-stream_loop", "-1", "-ss", f"{background_start:.3f}", "-i", str(background_path),
+        "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{overlay_w}x{overlay_h}", "-r", str(fps), "-i", "-",
+        # the pre-mixed soundtrack arrives as raw PCM on a second pipe
+        "-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", f"pipe:{audio_fd}",
+        "-filter_complex", filter_graph,
+    ]
+    for label, rendition in zip(labels, renditions):
+        command += output_args(label, "2:a", rendition, total_duration)
+    return command
+
+
+def write_fd(fd: int, data) -> None:
+    """
+    Writes data (bytes or a contiguous array, which is written without a copy) to a
+    raw pipe fd and closes it; used to feed ffmpeg a second input.
+    """
+    try:
+        with os.fdopen(fd, "wb") as pipe:
+            pipe.write(data)
+    except BrokenPipeError:
+        pass
+
+
+def render_video(
+    background_path: Path,
+    background_start,
+    soundtrack: np.ndarray,
+    intro_duration: float,
+    total_duration: float,
+    title_card: np.ndarray,
+    subtitle_track: SubtitleTrack,
+    output_path: Path,
+    size=(1080, 1920),
+    fps: int = 60,
+    sample_rate: int = 44100,
+    animation_rate: float = 0.4,
+    encoder_profile: dict = None,
+    sampler: tracing.FrameSampler = None,
+    renditions=None,
+) -> None:
+    """
+    Renders the whole video with a single ffmpeg process. ffmpeg seeks, loops, crops
+    and scales the background natively; Python only generates the overlay band,
+    streamed in as raw RGBA on stdin, and hands over the pre-mixed soundtrack
+    (float32, samples x channels) once on a second pipe.
+
+    A background_start of None means the background is too short and is looped from
+    its beginning. `renditions` encodes several outputs from the same composite
+    pass instead of output_path (see build_command). With a sampler, the per-frame encode time includes ffmpeg's own
+    background decode, which can't be told apart from here.
+    """
+    if background_start is None:
+        background_start = 0.0
+
+    # The band only has to be tall enough for the title card or a bounced word
+    width = size[0]
+    overlay_h = max(title_card.shape[0], subtitle_track.max_sprite_height())
+    overlay_h = min(size[1], overlay_h + overlay_h % 2)
+    layer = OverlayLayer((width, overlay_h), title_card, intro_duration, subtitle_track, animation_rate, fps)
+
+    audio_read, audio_write = os.pipe()
+    command = build_command(
+        background_path, background_start, audio_read, output_path,
+        size, (width, overlay_h), fps, total_duration, sample_rate, soundtrack.shape[1], encoder_profile, renditions,
+    )
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=(audio_read,))
+    os.close(audio_read)
+    # ffmpeg interleaves reads from both pipes, so the audio is fed from its own thread
+    audio_writer = threading.Thread(
+        target=write_fd, args=(audio_write, np.ascontiguousarray(soundtrack, dtype=np.float32)), daemon=True
+    )
+    audio_writer.start()
+    try:
+        for frame in overlay_frames(layer, total_duration, fps, sampler):
+            process.stdin.write(frame)
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    audio_writer.join()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed for {output_path}: {process.stderr.read().decode(errors='replace')}")
+
+
+def encode_frames(frames, size, fps: int, soundtrack: np.ndarray, total_duration: float, renditions,
+                  sample_rate: int = 44100) -> None:
+    """
+    Encodes RGB frames composited in Python (e.g. moviepy's iter_frames) into every
+    rendition with one ffmpeg process, so the frames are produced once however many
+    outputs there are.
+    """
+    width, height = size
+    fan_out, labels = rendition_graph("[0:v]", size, fps, renditions)
+    audio_read, audio_write = os.pipe()
+    command = [
+        ffmpeg_binaries.ffmpeg(), "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        "-f", "f32le", "-ar", str(sample_rate), "-ac", str(soundtrack.shape[1]), "-i", f"pipe:{audio_read}",
+    ]
+    if fan_out:
+        command += ["-filter_complex", ";".join(fan_out)]
+    for label, rendition in zip(labels, renditions):
+        command += output_args(label if fan_out else "0:v", "1:a", rendition, total_duration)
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=(audio_read,))
+    os.close(audio_read)
+    audio_writer = threading.Thread(
+        target=write_fd, args=(audio_write, np.ascontiguousarray(soundtrack, dtype=np.float32)), daemon=True
+    )
+    audio_writer.start()
+    try:
+        for frame in frames:
+            process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8))
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    audio_writer.join()
+    if process.wait() != 0:
+        outputs = ", ".join(str(rendition["path"]) for rendition in renditions)
+        raise RuntimeError(f"ffmpeg failed for {outputs}: {process.stderr.read().decode(errors='replace')}")
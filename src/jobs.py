@@ -0,0 +1,113 @@
+import hashlib
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    submission_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    failed_stage TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    submission_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    artifact TEXT,
+    content_hash TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (submission_id, stage)
+);
+"""
+
+
+def hash_text(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hash_array(array: np.ndarray) -> str:
+    digest = hashlib.sha256(str(array.shape).encode())
+    digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class JobStore:
+    """
+    SQLite manifest of a batch, keyed by submission id. Every stage records the hash
+    of its inputs, its output artifact and that artifact's content hash, so a rerun
+    can pick up at the first stage whose checkpoint is missing or stale.
+
+    Connections are opened per call, so one store can be shared by pipeline threads,
+    and each render process can open its own on the same file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def set_status(self, submission_id: str, url: str, status: str, failed_stage: str = None, error: str = None) -> None:
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?)",
+                (submission_id, url, status, failed_stage, error, time.time()),
+            )
+
+    def record(self, submission_id: str, stage: str, input_hash: str, content_hash: str, artifact: Path = None) -> None:
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?, ?)",
+                (submission_id, stage, input_hash, str(artifact) if artifact else None, content_hash, time.time()),
+            )
+
+    def checkpoint(self, submission_id: str, stage: str, input_hash: str):
+        """
+        The recorded content hash of a stage if it was completed from the same inputs
+        and its artifact (when it has one) is still on disk unchanged; otherwise None.
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT input_hash, artifact, content_hash FROM stages WHERE submission_id = ? AND stage = ?",
+                (submission_id, stage),
+            ).fetchone()
+        if row is None or row[0] != input_hash:
+            return None
+        artifact, content_hash = row[1], row[2]
+        if artifact is not None:
+            if not Path(artifact).exists() or hash_file(Path(artifact)) != content_hash:
+                return None
+        return content_hash
+
+    def status(self, submission_id: str):
+        with self._connect() as db:
+            row = db.execute("SELECT status FROM jobs WHERE submission_id = ?", (submission_id,)).fetchone()
+        return row[0] if row else None
@@ -1,27 +1,27 @@
+import argparse
+import json
 import os
-import re
-import random
+from functools import lru_cache
 from pathlib import Path
 
-from moviepy.editor import (
-    CompositeAudioClip,
-    concatenate_videoclips,
-    VideoFileClip,
-    CompositeVideoClip,
-    AudioFileClip,
-    ImageClip,
-    TextClip,
-    afx,
-)
-from moviepy.video.fx.all import crop
-
-import whisper_timestamped as whisper
-from audiostretchy.stretch import stretch_audio
-from PIL import Image, ImageDraw
+import numpy as np
 
 import fetch_data
 import create_box
+import audio
+import background_cache
+import encoder
+import ffmpeg_render
+import jobs
+import parts
+import segmented_render
+import text_processing
+import tracing
+from animation import ScaleAnimation, scale_sprite
+from pipeline import Pipeline, Stage
+from subtitles import SubtitleTrack, group_words, load_font
 from tiktokvoice import tts
+from transcription import Transcriber, load_samples
 
 # ---------- Config ----------
 os.environ["FFMPEG_BINARY"] = "/usr/bin/ffmpeg"
@@ -29,137 +29,105 @@ os.environ["FFMPEG_BINARY"] = "/usr/bin/ffmpeg"
 FONT = "Montserrat-ExtraBold"
 FONT_SIZE = 90
 SHADOW_STROKE = 10
-BACKGROUND_MUSIC_VOL = 0.15
+BACKGROUND_MUSIC_VOL = 0.15  # under speech
+BACKGROUND_MUSIC_IDLE_VOL = 0.3  # when nobody is talking
+VOICE2_SPEED = 0.85  # body narration duration ratio (< 1 is faster)
+TTS_VOICE = "en_us_010"
 FPS = 60
+VIDEO_SIZE = (1080, 1920)
+RENDERER = "moviepy"  # "moviepy" or "ffmpeg"
+WHISPER_MODEL = "medium"
+TRANSCRIBE_MODE = "align"  # "align": force-align the known text, Whisper as fallback; "whisper": always decode
+TRANSCRIBE_BACKEND = "faster_whisper"  # "faster_whisper" or "whisper_timestamped"
+WHISPER_COMPUTE_TYPE = "int8"  # faster_whisper only: "int8", "int8_float32", "float32"
+TRANSCRIBE_WORKERS = 2  # silence-split chunks decoded at once
+
+# "final" is what gets published; "draft" is for checking subtitle timing and the title card.
+# "encoder" names a profile in encoder.ENCODER_PROFILES; "auto" is this host's autotuned pick
+# (python encoder.py), falling back to encoder.DEFAULT_PROFILE.
+RENDER_MODES = {
+    "final": {"size": VIDEO_SIZE, "fps": FPS, "encoder": "auto", "suffix": ""},
+    "draft": {"size": (540, 960), "fps": 30, "encoder": "draft", "suffix": "_draft"},
+}
+
+# Renditions cut from the same render. Sizes are at final resolution and shrink with the mode;
+# each is center-cropped to its aspect ratio from the 9:16 master.
+OUTPUT_PROFILES = {
+    "tiktok": {"size": (1080, 1920), "fps": 60, "suffix": ""},
+    "shorts": {"size": (720, 1280), "fps": 30, "suffix": "_shorts"},
+    "square": {"size": (1080, 1080), "fps": 60, "suffix": "_square"},
+}
+PUBLISH_PROFILES = ["tiktok"]
+
+# Batch pipeline sizing
+FETCH_WORKERS = 2
+TTS_WORKERS = 4
+RENDER_WORKERS = os.cpu_count() or 1
+# Segmented rendering of a single video (moviepy renderer); 1 disables it
+SEGMENT_WORKERS = 1
+SEGMENT_SECONDS = 15
+# Word sprite and bounce caches (subtitles.py), in total across every render process: each of the
+# RENDER_WORKERS * SEGMENT_WORKERS processes that can render at once gets an even share.
+# Spawned workers inherit the setting through the environment.
+SUBTITLE_CACHE_MB = 1024
+os.environ["SUBTITLE_CACHE_BYTES"] = str(SUBTITLE_CACHE_MB * 1024 * 1024 // (RENDER_WORKERS * max(1, SEGMENT_WORKERS)))
+# Videos longer than this switch from moviepy to the streaming ffmpeg renderer, whose frame
+# memory doesn't grow with duration (the soundtrack still does); None keeps RENDERER always
+STREAM_RENDER_SECONDS = 90
+# With --parts, posts whose narration runs longer are split into "Part 1/2/3" videos
+MAX_PART_SECONDS = 150
 
 DATA_DIR = Path("../data")
 TEXT_AUDIO_DIR = DATA_DIR / "text_audio"
 FINISHED_DIR = DATA_DIR / "finished_vids"
 BACKGROUND_VIDEO_PATH = DATA_DIR / "background_video.webm"
+BACKGROUND_VIDEO_DIR = DATA_DIR / "background_videos"
+BACKGROUND_PROXY_DIR = DATA_DIR / "cache" / "background_proxies"
 BACKGROUND_MUSIC_PATH = DATA_DIR / "background_music" / "up_theme.mp3"
 LOGO_PATH = DATA_DIR / "logo.png"
+TRANSCRIPT_CACHE_DIR = DATA_DIR / "cache" / "transcripts"
+JOB_DB_PATH = DATA_DIR / "jobs.sqlite"
 
 TEXT_AUDIO_DIR.mkdir(parents=True, exist_ok=True)
 FINISHED_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def change_voice_pacing(voice_path: Path, speed: float = 0.85) -> Path:
-    new_path = voice_path.with_name(f"{voice_path.stem}_speed{speed}{voice_path.suffix}")
-    stretch_audio(str(voice_path), str(new_path), speed)
-    return new_path
-
-
-def create_masked_overlay(image_path: Path, output_path: Path, corner_radius: int = 20, new_size=None) -> None:
-    """Round corners with alpha mask. Optional resizing."""
-    with Image.open(image_path).convert("RGBA") as image:
-        if new_size:
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
-
-        width, height = image.size
-        mask = Image.new("L", (width, height), 0)
-        draw = ImageDraw.Draw(mask)
-        draw.rounded_rectangle((0, 0, width, height), corner_radius, fill=255)
-        image.putalpha(mask)
-        image.save(output_path)
+def parse_text(text: str) -> str:
+    """Expands abbreviations and age-gender formats (lexicon: data/lexicons/expansions.tsv)."""
+    return text_processing.rewrite(text, "expansions")
 
 
-def get_text_clips(transcribed_text):
-    """
-    Creates bouncing subtitle clips from whisper_timestamped output.
-    """
-    text_clips = []
-
-    def bounce(t):
-        # quick pop at the beginning of each word
-        return 1.1 + 0.1 * (1 - (t / 0.1) ** 2) if t <= 0.1 else 1.0
-
-    for segment in transcribed_text.get("segments", []):
-        words = segment.get("words", [])
-        i = 0
-        while i < len(words):
-            word_group = words[i:i + 2] if random.random() < 0.3 else words[i:i + 1]
-            text = " ".join(word["text"] for word in word_group).strip()
-
-            start_time = float(word_group[0]["start"])
-            end_time = float(word_group[-1]["end"])
-
-            shadow_clip = (
-                TextClip(
-                    text,
-                    font=FONT,
-                    fontsize=FONT_SIZE,
-                    color="black",
-                    stroke_color="black",
-                    stroke_width=SHADOW_STROKE,
-                )
-                .set_start(start_time)
-                .set_end(end_time)
-                .resize(lambda t: bounce(t))
-                .set_position("center")
-            )
-
-            text_clip = (
-                TextClip(text, font=FONT, fontsize=FONT_SIZE, color="white")
-                .set_start(start_time)
-                .set_end(end_time)
-                .resize(lambda t: bounce(t))
-                .set_position("center")
-            )
-
-            # Composite subtitle layers
-            text_clips.append(CompositeVideoClip([shadow_clip, text_clip]).set_position("center"))
-            i += len(word_group)
-
-    return text_clips
+def censor_text(text: str) -> str:
+    """Censors specific words (lexicon: data/lexicons/censor.tsv)."""
+    return text_processing.rewrite(text, "censor")
 
 
-def parse_text(text: str) -> str:
-    """Parses and replaces abbreviations and age-gender formats."""
-    replacements = {
-        r"\bAITA\b": "Am I the Asshole?",
-        r"\bTIFU\b": "Today I Fucked Up",
-        r"\bpussy\b": "coochie",
-        r"\bF(\d{2})\b": r"Female \1",
-        r"\bM(\d{2})\b": r"Male \1",
-        r"\b(\d{2})F\b": r"Female \1",
-        r"\b(\d{2})M\b": r"Male \1",
-        r"\((\d{2})F\)": r"(Female \1)",
-        r"\((\d{2})M\)": r"(Male \1)",
-        r"\(F(\d{2})\)": r"(Female \1)",
-        r"\(M(\d{2})\)": r"(Male \1)",
-    }
-    for pattern, repl in replacements.items():
-        text = re.sub(pattern, repl, text)
-    return text
+def prepare_backgrounds(mode: str = "final") -> list[dict]:
+    """One-time step: pre-crop/scale every background into a short-GOP proxy at the mode's size and FPS."""
+    settings = RENDER_MODES[mode]
+    sources = background_cache.find_sources(BACKGROUND_VIDEO_DIR, BACKGROUND_VIDEO_PATH)
+    return background_cache.prepare_pool(sources, BACKGROUND_PROXY_DIR, settings["size"], settings["fps"])
 
 
-def censor_text(text: str) -> str:
-    """Censors specific words."""
-    censored_words = {
-        r"\bfuck\b": "f*ck",
-        r"\bshit\b": "sh*t",
-        r"\basshole\b": "a**hole",
-        r"\bbitch\b": "b*tch",
-        r"\bcondom\b": "c*ndom",
-        r"\bpussy\b": "p*ssy",
-        r"\bdamn\b": "d*mn",
-        r"\bhell\b": "h*ll",
-    }
-    for pattern, repl in censored_words.items():
-        text = re.sub(pattern, repl, text, flags=re.IGNORECASE)
-    return text
+@lru_cache(maxsize=4)
+def _background_pool(size=VIDEO_SIZE, fps: int = FPS) -> list[dict]:
+    return background_cache.load_pool(BACKGROUND_PROXY_DIR, tuple(size), fps)
 
 
-def _fit_background_to_duration(background_video: VideoFileClip, total_duration: float) -> VideoFileClip:
+def _fit_background_to_duration(total_duration: float, background: dict = None, start_time=None):
     """
-    Ensures the background can provide total_duration.
-    If too short, loop it. If long enough, take a random subclip.
+    Picks a background from the proxy pool that can provide total_duration, unless one
+    is given. If long enough, take a random keyframe-aligned subclip. If too short, loop it.
     """
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+    if background is None:
+        background, start_time = background_cache.pick_window(_background_pool(), total_duration)
+    background_video = VideoFileClip(background["proxy"])
     if background_video.duration <= 0:
         raise ValueError("Background video has invalid duration.")
 
-    if background_video.duration >= total_duration + 0.1:
-        start_time = random.uniform(0, background_video.duration - total_duration)
+    if start_time is not None:
         return background_video.subclip(start_time, start_time + total_duration)
 
     # Loop to fill
@@ -169,141 +137,548 @@ def _fit_background_to_duration(background_video: VideoFileClip, total_duration:
     return looped.subclip(0, total_duration)
 
 
-def create_tiktok_clip(
-    model,
-    background_video_path: Path,
-    background_music_path: Path,
-    voice1_path: Path,
-    voice2_path: Path,
-    overlay_image_path: Path,
-    output_path: Path,
-    overlay_size=None,
-    animation_rate: float = 0.4,
-):
-    background_video = VideoFileClip(str(background_video_path))
-    background_music = AudioFileClip(str(background_music_path))
-    voice1 = AudioFileClip(str(voice1_path))
-    voice2 = AudioFileClip(str(voice2_path))
+def _saved_plan(plan_path: Path, total_duration: float):
+    if plan_path is None or not plan_path.exists():
+        return None
+    saved = json.loads(plan_path.read_text())
+    # a different voice track means different word timings; start over
+    if abs(saved["total_duration"] - total_duration) > 1e-3:
+        return None
+    return saved
 
-    # Transcribe voice2 once
-    transcribed_text = whisper.transcribe(model, str(voice2_path), language="en")
 
-    total_duration = float(voice1.duration + voice2.duration + 2.0)
+def plan_video(transcribed_text, title_card: np.ndarray, intro_duration: float, total_duration: float,
+               animation_rate: float, mode: str = "final", plan_path: Path = None, encoder_name: str = None) -> dict:
+    """
+    Every random choice for one video, made up front: background window and subtitle
+    word grouping. Rendering from the same plan always gives the same frames, which is
+    what lets segments be rendered in separate processes.
 
-    # Fit background to duration (loop or random subclip)
-    background_video = _fit_background_to_duration(background_video, total_duration)
+    With a plan_path the choices are saved, and reused by later renders of the same
+    voice track, so promoting a checked draft to final gives the same video.
+    """
+    settings = RENDER_MODES[mode]
+    pool = _background_pool(settings["size"], settings["fps"])
+
+    saved = _saved_plan(plan_path, total_duration)
+    background = None
+    if saved is not None:
+        events = [tuple(event) for event in saved["events"]]
+        background = next((index for index in pool if index["source"] == saved["background_source"]), None)
+        background_start = saved["background_start"]
+    else:
+        events = group_words(transcribed_text)
+    if background is None:
+        background, background_start = background_cache.pick_window(pool, total_duration)
+
+    if plan_path is not None:
+        plan_path.write_text(json.dumps({
+            "total_duration": total_duration,
+            "background_source": background["source"],
+            "background_start": background_start,
+            "events": events,
+        }))
+
+    scale = settings["size"][0] / VIDEO_SIZE[0]
+    return {
+        "background": background,
+        "background_start": background_start,
+        "events": events,
+        "title_card": scale_sprite(title_card, scale),
+        "intro_duration": intro_duration,
+        "total_duration": total_duration,
+        "animation_rate": animation_rate,
+        "size": settings["size"],
+        "fps": settings["fps"],
+        "encoder": encoder.resolve(encoder_name or settings["encoder"]),
+        "scale": scale,
+    }
 
-    # Crop to 9:16
-    background_video = crop(
-        background_video,
-        width=background_video.h * 9 / 16,
-        height=background_video.h,
-        x_center=background_video.w / 2,
+
+def _subtitle_track(plan: dict) -> SubtitleTrack:
+    scale = plan["scale"]
+    return SubtitleTrack(
+        plan["events"], FONT, round(FONT_SIZE * scale), max(1, round(SHADOW_STROKE * scale)), plan["fps"]
     )
 
-    # Masked overlay unique per output to avoid overwriting
-    masked_overlay_path = output_path.with_suffix("").with_name(output_path.stem + "_masked_overlay.png")
-    create_masked_overlay(overlay_image_path, masked_overlay_path, new_size=overlay_size)
 
-    overlay_image = ImageClip(str(masked_overlay_path)).set_duration(voice1.duration)
-    overlay_image = overlay_image.resize(lambda t: 0.95 + 0.05 * min(1, t / animation_rate)).set_position("center")
+def _frame_sampler(**attrs):
+    every = tracing.frame_sample()
+    return tracing.FrameSampler("frame", every, **attrs) if every else None
+
 
-    intro_background = background_video.subclip(0, voice1.duration)
-    intro_clip = CompositeVideoClip([intro_background, overlay_image]).set_audio(voice1)
+def build_video_clip(plan: dict, sampler: tracing.FrameSampler = None):
+    """The silent video described by a plan; with a sampler, frame costs are traced."""
+    # moviepy is imported where it's used so the daemon and thin clients start fast
+    from moviepy.editor import CompositeVideoClip, VideoClip, concatenate_videoclips
 
-    text_clips = get_text_clips(transcribed_text)
+    intro_duration = plan["intro_duration"]
+    total_duration = plan["total_duration"]
+    animation_rate = plan["animation_rate"]
+    fps = plan["fps"]
 
-    main_background = background_video.subclip(voice1.duration, total_duration)
-    main_clip = CompositeVideoClip([main_background] + text_clips).set_audio(voice2)
+    # Fit background to duration (loop or random subclip); proxies are already 9:16
+    background_video = _fit_background_to_duration(total_duration, plan["background"], plan["background_start"])
+    if sampler:
+        background_video = background_video.fl(sampler.decode)
 
-    final_clip = concatenate_videoclips([intro_clip, main_clip])
+    # Enlarge effect pre-rendered once; the static tail reuses a single bitmap
+    card_animation = ScaleAnimation(plan["title_card"], lambda t: 0.95 + 0.05 * min(1, t / animation_rate), animation_rate, fps)
+    overlay_image = (
+        VideoClip(card_animation.rgb, duration=intro_duration)
+        .set_mask(VideoClip(card_animation.mask, ismask=True, duration=intro_duration))
+        .set_position("center")
+    )
 
-    background_music = afx.audio_loop(background_music, duration=total_duration)
-    final_audio = CompositeAudioClip([background_music.volumex(BACKGROUND_MUSIC_VOL), final_clip.audio])
+    intro_background = background_video.subclip(0, intro_duration)
+    intro_clip = CompositeVideoClip([intro_background, overlay_image])
 
-    # Small trim to avoid encoder trailing issues
-    final_audio = final_audio.subclip(0, max(0.0, final_audio.duration - 0.5))
-    finished_clip = final_clip.set_audio(final_audio)
+    subtitle_track = _subtitle_track(plan)
 
-    finished_clip.write_videofile(str(output_path), codec="libx264", fps=FPS)
+    # One layer: each frame blits only the word active at t (t is relative to voice2)
+    main_background = background_video.subclip(intro_duration, total_duration)
+    main_clip = main_background.fl(lambda gf, t: subtitle_track.blit(gf(t), t))
 
-    # Optional: cleanup masked overlay file
-    try:
-        masked_overlay_path.unlink(missing_ok=True)
-    except Exception:
-        pass
+    video = concatenate_videoclips([intro_clip, main_clip])
+    return video.fl(sampler.frame) if sampler else video
 
 
-def process_videos(urls):
-    # Load Whisper model once
-    model = whisper.load_model("medium", device="cpu")
+def render_segment(plan: dict, start_frame: int, end_frame: int, output_path: str) -> None:
+    """Worker for segmented rendering: frames [start_frame, end_frame) of the plan, video only."""
+    fps = plan["fps"]
+    sampler = _frame_sampler(renderer="moviepy", output=output_path)
+    clip = build_video_clip(plan, sampler).subclip(start_frame / fps)
+    # moviepy writes a frame for every t in np.arange(0, duration, 1 / fps), i.e. ceil(duration * fps)
+    # of them; half a frame short of the end makes that exactly end_frame - start_frame
+    clip = clip.set_duration((end_frame - start_frame - 0.5) / fps)
+    with tracing.span("render_segment", output=output_path, start_frame=start_frame, end_frame=end_frame):
+        clip.write_videofile(output_path, fps=fps, logger=None, **encoder.moviepy_kwargs(plan["encoder"], audio=False))
+    if sampler:
+        sampler.close()
 
-    for url in urls:
-        try:
-            submission_id = fetch_data.getSubmissionID(url)
-            post_title_raw = fetch_data.getSubmissionTitle(url)
-            post_body_raw = fetch_data.getSubmissionBody(url)
 
-            safe_title = censor_text(post_title_raw)
-            overlay_img_path_str = create_box.create_text_image_with_overlay(
-                safe_title, 20, str(LOGO_PATH), "lol.png"
-            )
+def rendition_paths(output_path: Path, profiles) -> dict:
+    """Output file of each profile, next to output_path and marked with the profile's suffix."""
+    output_path = Path(output_path)
+    return {
+        name: output_path.with_name(f"{output_path.stem}{OUTPUT_PROFILES[name]['suffix']}{output_path.suffix}")
+        for name in profiles
+    }
+
+
+def _renditions(plan: dict, output_path: Path, profiles) -> list[dict]:
+    renditions = []
+    for name, path in rendition_paths(output_path, profiles).items():
+        profile = OUTPUT_PROFILES[name]
+        width, height = (round(side * plan["scale"]) // 2 * 2 for side in profile["size"])
+        renditions.append({
+            "path": path, "size": (width, height), "fps": min(profile["fps"], plan["fps"]), "encoder": plan["encoder"],
+        })
+    return renditions
+
+
+def create_tiktok_clip(
+    transcribed_text,
+    background_music_path: Path,
+    voice1_path: Path,
+    voice2_path: Path,
+    title_card: np.ndarray,
+    output_path: Path,
+    animation_rate: float = 0.4,
+    renderer: str = RENDERER,
+    voice2_speed: float = 1.0,
+    segment_workers: int = SEGMENT_WORKERS,
+    mode: str = "final",
+    plan_path: Path = None,
+    voice2_range=None,
+    profiles=None,
+    encoder_name: str = None,
+):
+    """
+    Renders one video to output_path. With `profiles` (names in OUTPUT_PROFILES) it
+    writes one file per profile instead, all from a single composite pass.
+    `encoder_name` overrides the mode's encoder profile.
+    """
+    # Decode everything once and pre-mix the whole soundtrack in memory
+    with tracing.span("decode_audio", output=output_path):
+        voice1 = audio.decode(voice1_path)
+        voice2 = audio.decode(voice2_path, speed=voice2_speed)
+        music = audio.decode(background_music_path)
+    if voice2_range is not None:
+        # one part of a split post: (start, end) seconds of the sped-up narration, end None for the rest
+        start, end = voice2_range
+        voice2 = voice2[int(start * audio.SAMPLE_RATE):None if end is None else int(end * audio.SAMPLE_RATE)]
+    with tracing.span("mix_audio", output=output_path):
+        soundtrack = audio.mix(voice1, voice2, music, BACKGROUND_MUSIC_VOL, BACKGROUND_MUSIC_IDLE_VOL)
+    intro_duration = len(voice1) / audio.SAMPLE_RATE
+    total_duration = (len(voice1) + len(voice2)) / audio.SAMPLE_RATE + 2.0
+
+    with tracing.span("plan", output=output_path):
+        plan = plan_video(
+            transcribed_text, title_card, intro_duration, total_duration, animation_rate, mode, plan_path, encoder_name
+        )
+
+    if renderer != "ffmpeg" and STREAM_RENDER_SECONDS is not None and total_duration > STREAM_RENDER_SECONDS \
+            and segment_workers <= 1:
+        print(f"[INFO] {output_path.name} runs {total_duration:.0f}s, over STREAM_RENDER_SECONDS: using ffmpeg, not {renderer}")
+        renderer = "ffmpeg"
+
+    renditions = _renditions(plan, output_path, profiles) if profiles else None
+    if renditions and len(renditions) == 1 and renditions[0]["size"] == tuple(plan["size"]) \
+            and renditions[0]["fps"] == plan["fps"]:
+        # a single rendition at the master settings is a plain render
+        output_path, renditions = renditions[0]["path"], None
+
+    with tracing.span("render", output=output_path, renderer=renderer, mode=mode, video_seconds=total_duration):
+        _render(plan, soundtrack, output_path, renderer, segment_workers, renditions)
+
+
+def _render(plan: dict, soundtrack: np.ndarray, output_path: Path, renderer: str, segment_workers: int,
+            renditions=None) -> None:
+    """Encodes a planned video and its pre-mixed soundtrack with the chosen renderer."""
+    intro_duration = plan["intro_duration"]
+    total_duration = plan["total_duration"]
+    if renderer == "ffmpeg":
+        # Background never enters Python: ffmpeg decodes and crops it, we pipe the overlay and soundtrack
+        ffmpeg_render.render_video(
+            background_path=Path(plan["background"]["proxy"]),
+            background_start=plan["background_start"],
+            soundtrack=soundtrack,
+            intro_duration=intro_duration,
+            total_duration=total_duration,
+            title_card=plan["title_card"],
+            subtitle_track=_subtitle_track(plan),
+            output_path=output_path,
+            size=plan["size"],
+            fps=plan["fps"],
+            sample_rate=audio.SAMPLE_RATE,
+            animation_rate=plan["animation_rate"],
+            encoder_profile=plan["encoder"],
+            sampler=_frame_sampler(renderer="ffmpeg", output=output_path),
+            renditions=renditions,
+        )
+        return
+
+    if renditions:
+        # composite each frame once in moviepy, one ffmpeg scales and encodes every rendition
+        sampler = _frame_sampler(renderer="moviepy", output=output_path)
+        clip = build_video_clip(plan, sampler)
+        ffmpeg_render.encode_frames(
+            clip.iter_frames(fps=plan["fps"], dtype="uint8"), plan["size"], plan["fps"], soundtrack,
+            total_duration, renditions, audio.SAMPLE_RATE,
+        )
+        if sampler:
+            sampler.close()
+        return
+
+    if segment_workers > 1:
+        # Cut at the intro/body boundary and every SEGMENT_SECONDS, encode in parallel, concat losslessly
+        segmented_render.render_segmented(
+            render_segment, plan, soundtrack, output_path, plan["fps"],
+            cuts=[intro_duration], segment_seconds=SEGMENT_SECONDS, workers=segment_workers,
+            sample_rate=audio.SAMPLE_RATE,
+        )
+        return
+
+    from moviepy.audio.AudioClip import AudioArrayClip
+
+    sampler = _frame_sampler(renderer="moviepy", output=output_path)
+    finished_clip = build_video_clip(plan, sampler).set_audio(AudioArrayClip(soundtrack, fps=audio.SAMPLE_RATE))
+    finished_clip.write_videofile(str(output_path), fps=plan["fps"], **encoder.moviepy_kwargs(plan["encoder"]))
+    if sampler:
+        sampler.close()
+
+
+@lru_cache(maxsize=1)
+def _job_store() -> jobs.JobStore:
+    # one per process; the render workers open their own
+    return jobs.JobStore(JOB_DB_PATH)
+
+
+def fetch_stage(job: dict) -> dict:
+    submission = fetch_data.fetch_submission(job["url"])
+    submission_id = submission.id
+    post_title_raw = submission.title
+    post_body_raw = submission.selftext
+
+    safe_title = censor_text(post_title_raw)
+
+    job.update(
+        submission_id=submission_id,
+        safe_title=safe_title,
+        post_title=parse_text(post_title_raw),
+        post_body=parse_text(post_body_raw),
+        title_card=create_box.render_title_card(safe_title, 20, LOGO_PATH),
+    )
+
+    store = _job_store()
+    store.set_status(submission_id, job["url"], "running")
+    job["hashes"] = {
+        "fetch": jobs.hash_text(job["post_title"], job["post_body"]),
+        "overlay": jobs.hash_array(job["title_card"]),
+    }
+    store.record(submission_id, "fetch", jobs.hash_text(job["url"]), job["hashes"]["fetch"])
+    store.record(submission_id, "overlay", jobs.hash_text(safe_title, LOGO_PATH), job["hashes"]["overlay"])
+    return job
 
-            # Some versions return just a path; normalize
-            overlay_img_path = Path(overlay_img_path_str) if isinstance(overlay_img_path_str, str) else Path(overlay_img_path_str[0])
 
-            post_title = parse_text(post_title_raw)
-            post_body = parse_text(post_body_raw)
+def tts_stage(job: dict) -> dict:
+    submission_id = job["submission_id"]
+    store = _job_store()
+    voices = {
+        "voice1": (job["post_title"], TEXT_AUDIO_DIR / f"postVoice_{submission_id}.mp3"),
+        "voice2": (job["post_body"], TEXT_AUDIO_DIR / f"bodyVoice_{submission_id}.mp3"),
+    }
 
-            voice1_path = TEXT_AUDIO_DIR / f"postVoice_{submission_id}.mp3"
-            voice2_path = TEXT_AUDIO_DIR / f"bodyVoice_{submission_id}.mp3"
+    for stage, (text, voice_path) in voices.items():
+        input_hash = jobs.hash_text(text, TTS_VOICE)
+        content_hash = store.checkpoint(submission_id, stage, input_hash)
+        if content_hash is None:
+            voice_path = Path(tts(text, TTS_VOICE, str(voice_path)))
+            content_hash = jobs.hash_file(voice_path)
+            store.record(submission_id, stage, input_hash, content_hash, voice_path)
+        job[f"{stage}_path"] = voice_path
+        job["hashes"][stage] = content_hash
+    return job
+
+
+class TranscribeStage:
+    """Runs on a single worker so the Whisper model is loaded once and stays warm for the batch."""
+
+    def __init__(self, model_name: str = WHISPER_MODEL, device: str = "cpu", mode: str = TRANSCRIBE_MODE,
+                 backend: str = TRANSCRIBE_BACKEND, compute_type: str = WHISPER_COMPUTE_TYPE):
+        self.transcriber = Transcriber(
+            TRANSCRIPT_CACHE_DIR, model_name=model_name, device=device, mode=mode,
+            backend=backend, compute_type=compute_type, workers=TRANSCRIBE_WORKERS,
+        )
+        self.settings = (self.transcriber.backend.key, mode, VOICE2_SPEED)
+
+    def __call__(self, job: dict) -> dict:
+        submission_id = job["submission_id"]
+        store = _job_store()
+        transcript_path = TEXT_AUDIO_DIR / f"transcript_{submission_id}.json"
+        input_hash = jobs.hash_text(job["hashes"]["voice2"], job["post_body"], *self.settings)
+
+        content_hash = store.checkpoint(submission_id, "transcript", input_hash)
+        if content_hash is not None:
+            job["transcript"] = json.loads(transcript_path.read_text())
+        else:
+            # post_body is exactly what was sent to TTS, so it can be aligned instead of transcribed
+            samples = load_samples(job["voice2_path"], speed=VOICE2_SPEED)
+            job["transcript"] = self.transcriber.transcribe(samples, text=job["post_body"])
+            transcript_path.write_text(json.dumps(job["transcript"]))
+            content_hash = jobs.hash_file(transcript_path)
+            store.record(submission_id, "transcript", input_hash, content_hash, transcript_path)
+        job["hashes"]["transcript"] = content_hash
+        return job
 
-            v1 = Path(tts(post_title, "en_us_010", str(voice1_path)))
-            v2 = Path(tts(post_body, "en_us_010", str(voice2_path)))
-            v2 = change_voice_pacing(v2, speed=0.85)
 
-            # If overlay size is needed, read dimensions
-            # Default: scale to a reasonable width
-            overlay_size = (950, 350) if not overlay_img_path.exists() else None
+def split_stage(job: dict):
+    """
+    With split_parts set, turns a long post into one job per part, cut at sentence
+    boundaries of the transcript, so the parts render concurrently on the render workers.
+    """
+    if not job.get("split_parts"):
+        return job
+    ranges = parts.split_points(job["transcript"], MAX_PART_SECONDS)
+    if len(ranges) == 1:
+        return job
+
+    part_jobs = []
+    for number, (start, end) in enumerate(ranges, 1):
+        title_card = create_box.render_title_card(f"{job['safe_title']} (Part {number}/{len(ranges)})", 20, LOGO_PATH)
+        part_jobs.append(dict(
+            job,
+            part=(number, len(ranges)),
+            part_range=(start, end),
+            transcript=parts.slice_transcript(job["transcript"], start, end),
+            title_card=title_card,
+            hashes=dict(job["hashes"], overlay=jobs.hash_array(title_card)),
+        ))
+    return part_jobs
+
+
+def render_stage(job: dict) -> dict:
+    """Runs in a worker process; everything it needs travels in the job dict."""
+    submission_id = job["submission_id"]
+    mode = job.get("mode", "final")
+    name = f"{submission_id}_part{job['part'][0]}" if "part" in job else submission_id
+    output_path = FINISHED_DIR / f"{name}_video{RENDER_MODES[mode]['suffix']}.mp4"
+    outputs = rendition_paths(output_path, PUBLISH_PROFILES)
+    job["output_paths"] = list(outputs.values())
+    job["output_path"] = job["output_paths"][0]
+
+    store = _job_store()
+    hashes = job["hashes"]
+    input_hash = jobs.hash_text(
+        hashes["voice1"], hashes["voice2"], hashes["transcript"], hashes["overlay"],
+        mode, RENDER_MODES[mode], RENDERER, BACKGROUND_MUSIC_PATH, BACKGROUND_MUSIC_VOL, BACKGROUND_MUSIC_IDLE_VOL,
+        job.get("part"), job.get("part_range"), encoder.resolve(job.get("encoder") or RENDER_MODES[mode]["encoder"]),
+    )
+    stage = f"video_{mode}_part{job['part'][0]}" if "part" in job else f"video_{mode}"
+    # one checkpoint per rendition, e.g. video_final and video_final_shorts
+    checkpoints = {
+        name: (f"{stage}{OUTPUT_PROFILES[name]['suffix']}", jobs.hash_text(input_hash, OUTPUT_PROFILES[name]))
+        for name in PUBLISH_PROFILES
+    }
+    if all(store.checkpoint(submission_id, *checkpoint) is not None for checkpoint in checkpoints.values()):
+        job["skipped"] = True
+        return job
+
+    create_tiktok_clip(
+        transcribed_text=job["transcript"],
+        background_music_path=BACKGROUND_MUSIC_PATH,
+        voice1_path=job["voice1_path"],
+        voice2_path=job["voice2_path"],
+        title_card=job["title_card"],
+        output_path=output_path,
+        animation_rate=0.1,
+        voice2_speed=VOICE2_SPEED,
+        mode=mode,
+        plan_path=FINISHED_DIR / f"{name}_plan.json",
+        voice2_range=job.get("part_range"),
+        profiles=PUBLISH_PROFILES,
+        encoder_name=job.get("encoder"),
+    )
+    for name, (checkpoint_stage, checkpoint_hash) in checkpoints.items():
+        store.record(submission_id, checkpoint_stage, checkpoint_hash, jobs.hash_file(outputs[name]), outputs[name])
+    return job
+
+
+def _report_job(job: dict) -> None:
+    store = _job_store()
+    if "error" in job:
+        print(f"[ERROR] Failed for URL {job['url']} during {job['failed_stage']}: {job['error']}")
+        if "submission_id" in job:
+            store.set_status(job["submission_id"], job["url"], "failed", job["failed_stage"], str(job["error"]))
+        return
+    outputs = ", ".join(str(path) for path in job["output_paths"])
+    print(f"[SKIP] Up to date: {outputs}" if job.get("skipped") else f"[OK] Created: {outputs}")
+    # one failed part fails the post, whatever order its parts finish in
+    if "part" not in job or store.status(job["submission_id"]) != "failed":
+        store.set_status(job["submission_id"], job["url"], "done")
+
+
+def warm_up_worker() -> None:
+    """Render process initializer: pay for imports and font/logo loading before the first job."""
+    import moviepy.editor  # noqa: F401
+
+    for mode in RENDER_MODES.values():
+        scale = mode["size"][0] / VIDEO_SIZE[0]
+        load_font(FONT, round(FONT_SIZE * scale))
+    create_box.render_title_card("", 20, LOGO_PATH)
+
+
+def build_pipeline(transcribe_stage=None, collect_results: bool = True) -> Pipeline:
+    return Pipeline(
+        [
+            Stage("fetch", fetch_stage, workers=FETCH_WORKERS),
+            Stage("tts", tts_stage, workers=TTS_WORKERS),
+            Stage("transcribe", transcribe_stage or TranscribeStage(), workers=1),
+            Stage("split", split_stage, workers=1),
+            Stage(
+                "render", render_stage, workers=RENDER_WORKERS, processes=True, queue_size=RENDER_WORKERS,
+                initializer=warm_up_worker,
+            ),
+        ],
+        on_result=_report_job,
+        collect_results=collect_results,
+    )
 
-            output_path = FINISHED_DIR / f"{submission_id}_video.mp4"
 
-            create_tiktok_clip(
-                model=model,
-                background_video_path=BACKGROUND_VIDEO_PATH,
-                background_music_path=BACKGROUND_MUSIC_PATH,
-                voice1_path=v1,
-                voice2_path=v2,
-                overlay_image_path=overlay_img_path,
-                output_path=output_path,
-                overlay_size=overlay_size,
-                animation_rate=0.1,
-            )
+def process_videos(urls, mode: str = "final", split_parts: bool = False, encoder_name: str = None):
+    """
+    Runs the batch as a pipeline: Reddit fetch and TTS on threads, transcription on one
+    worker holding the Whisper model, rendering on a process pool, with bounded queues
+    in between so network, transcription and encoding overlap across posts.
 
-            print(f"[OK] Created: {output_path}")
+    Fetched posts, TTS audio and transcripts are all cached, so rendering a batch again
+    in "final" mode after a "draft" pass only pays for the encode. Every stage is
+    checkpointed in the job store: after a crash, rerunning the batch resumes each post
+    at its first incomplete stage and skips posts whose video is already up to date.
+
+    With split_parts, posts longer than MAX_PART_SECONDS become "Part 1/2/3" videos.
+    encoder_name picks an encoder profile for the whole batch instead of the mode's.
+    """
+    with tracing.span("prepare_backgrounds", mode=mode):
+        prepare_backgrounds(mode)
+
+    pipeline = build_pipeline()
+    with tracing.span("batch", videos=len(urls), mode=mode):
+        results = pipeline.run(
+            {"url": url, "mode": mode, "split_parts": split_parts, "encoder": encoder_name} for url in urls
+        )
+    print(pipeline.report())
+    return results
+
+
+def subreddit_urls(subreddit: str, limit: int = 25, time_filter: str = "day") -> list[str]:
+    """Top self-posts of a subreddit; the records are cached, so fetch_stage won't request them again."""
+    return [post.url for post in fetch_data.fetch_top(subreddit, limit, time_filter) if post.selftext]
 
-        except Exception as e:
-            print(f"[ERROR] Failed for URL {url}: {e}")
+
+def expand_entry(entry: str) -> list[str]:
+    """A post URL as-is, or r/<subreddit> expanded to its top posts."""
+    if entry.startswith("https://www.reddit.com"):
+        return [entry]
+    if entry.startswith("r/") and len(entry) > 2:
+        harvested = subreddit_urls(entry[2:])
+        print(f"Added {len(harvested)} posts from {entry}.")
+        return harvested
+    raise ValueError(f"Invalid URL: {entry}")
 
 
 def input_urls():
     urls = []
     while True:
-        url = input("Enter a Reddit post URL (or 'done' to finish): ").strip()
+        url = input("Enter a Reddit post URL, or r/<subreddit> for its top posts (or 'done' to finish): ").strip()
         if url.lower() == "done":
             break
-        if url.startswith("https://www.reddit.com"):
-            urls.append(url)
-        else:
+        try:
+            urls.extend(expand_entry(url))
+        except ValueError:
             print("Invalid URL. Please enter a valid Reddit post URL.")
     return urls
 
 
+def read_urls_file(path: Path) -> list[str]:
+    """One URL or r/<subreddit> per line; blank lines and # comments are ignored."""
+    urls = []
+    for line in Path(path).read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.extend(expand_entry(line))
+    return urls
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TikTok video generator")
+    parser.add_argument(
+        "--draft", action="store_true",
+        help="quick low-res, low-fps preview; a later run without --draft promotes it to final",
+    )
+    parser.add_argument(
+        "--parts", action="store_true", help=f"split posts longer than {MAX_PART_SECONDS}s into Part 1/2/3 videos"
+    )
+    parser.add_argument(
+        "--encoder", choices=["auto", *encoder.ENCODER_PROFILES],
+        help="encoder profile (default: the mode's; 'auto' is this host's autotuned pick, see encoder.py)",
+    )
+    parser.add_argument("--urls-file", type=Path, help="batch mode: read URLs from this file instead of prompting")
+    parser.add_argument("--trace-metrics", type=Path, help="write timing spans to this JSON-lines file")
+    parser.add_argument("--trace-chrome", type=Path, help="also write them as a Chrome trace")
+    parser.add_argument(
+        "--trace-frames", type=int, default=0, metavar="N",
+        help="with tracing on, also time every Nth frame (decode / composite / encode)",
+    )
+    args = parser.parse_args()
+    if args.trace_metrics or args.trace_chrome:
+        tracing.configure(args.trace_metrics, args.trace_chrome, args.trace_frames)
+
     print("Welcome to the TikTok video generator!")
-    urls = input_urls()
+    urls = read_urls_file(args.urls_file) if args.urls_file else input_urls()
     if urls:
-        process_videos(urls)
+        process_videos(urls, mode="draft" if args.draft else "final", split_parts=args.parts, encoder_name=args.encoder)
         print(f"Processed {len(urls)} videos. Check {FINISHED_DIR}/ for output files.")
     else:
         print("No URLs provided. Exiting.")
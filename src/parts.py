@@ -0,0 +1,67 @@
+import math
+
+SENTENCE_ENDINGS = (".", "!", "?")
+
+
+def _words(transcript: dict) -> list[dict]:
+    return [word for segment in transcript.get("segments", []) for word in segment.get("words", [])]
+
+
+def _ends_sentence(word: dict) -> bool:
+    return word["text"].strip().rstrip("\"')]*").endswith(SENTENCE_ENDINGS)
+
+
+def split_points(transcript: dict, max_seconds: float) -> list[tuple[float, float]]:
+    """
+    Splits a transcript's timeline into parts no longer than about `max_seconds`,
+    cutting in the pause after a sentence where possible. Parts are balanced: a
+    5 minute story with a 2 minute limit becomes three ~100 second parts, not
+    2 + 2 + 1. Returns (start, end) times; the last part's end is None (to the end
+    of the audio).
+    """
+    words = _words(transcript)
+    if not words or max_seconds <= 0:
+        return [(0.0, None)]
+    duration = float(words[-1]["end"])
+    count = math.ceil(duration / max_seconds)
+    if count <= 1:
+        return [(0.0, None)]
+
+    # a cut sits halfway through the pause after a word; prefer sentence ends
+    boundaries = [
+        ((float(word["end"]) + float(following["start"])) / 2, _ends_sentence(word))
+        for word, following in zip(words[:-1], words[1:])
+    ]
+    sentence_cuts = [time for time, is_sentence_end in boundaries if is_sentence_end]
+    candidates = sentence_cuts or [time for time, _ in boundaries]
+
+    cuts = []
+    for k in range(1, count):
+        target = duration * k / count
+        previous = cuts[-1] if cuts else 0.0
+        # stay within the limit of the previous cut when a sentence end allows it
+        allowed = [t for t in candidates if previous < t <= previous + max_seconds] or \
+                  [t for t in candidates if t > previous]
+        if not allowed:
+            break
+        cuts.append(min(allowed, key=lambda t: abs(t - target)))
+
+    starts = [0.0] + cuts
+    return list(zip(starts, cuts + [None]))
+
+
+def slice_transcript(transcript: dict, start: float, end: float = None) -> dict:
+    """The words between start and end, re-timed so the slice starts at 0."""
+    segments = []
+    for segment in transcript.get("segments", []):
+        words = [
+            dict(word, start=float(word["start"]) - start, end=float(word["end"]) - start)
+            for word in segment.get("words", [])
+            if float(word["start"]) >= start and (end is None or float(word["start"]) < end)
+        ]
+        if words:
+            segments.append(dict(
+                segment, words=words, start=words[0]["start"], end=words[-1]["end"],
+                text=" ".join(word["text"] for word in words),
+            ))
+    return dict(transcript, segments=segments, text=" ".join(segment["text"] for segment in segments))
@@ -0,0 +1,226 @@
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import tracing
+
+# sentinel pushed through the queues once no more jobs will be submitted
+_DONE = object()
+
+
+def _noop() -> None:
+    pass
+
+
+class Stage:
+    """
+    One step of the pipeline.
+
+    `func` takes a job dict and returns the (updated) job dict, or a list of job dicts
+    to split one job into several that continue separately. Thread stages call it
+    directly from `workers` threads; process stages ship the job to a process pool of
+    `workers` processes, so `func` and the job must be picklable. A process stage's
+    `initializer` runs once in every worker process as soon as the pipeline starts.
+    """
+
+    def __init__(self, name: str, func, workers: int = 1, processes: bool = False, queue_size: int = 2,
+                 initializer=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.processes = processes
+        self.queue_size = queue_size
+        self.initializer = initializer
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0      # seconds spent doing work
+        self.starved = 0.0   # seconds spent waiting for upstream
+        self.blocked = 0.0   # seconds spent waiting for room downstream (backpressure)
+        self.max_depth = 0   # deepest the input queue got
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Pipeline:
+    """
+    Runs jobs through a chain of stages connected by bounded queues, so slow stages
+    push back on fast ones instead of letting work pile up in memory.
+
+    A job that raises in any stage is reported through `on_result` with its "error"
+    and "failed_stage" keys set and is dropped from the rest of the chain; the other
+    jobs keep flowing. If a process stage's worker dies outright, the jobs it was
+    running fail and the stage gets a fresh pool for the jobs behind them.
+
+    Finished jobs are also kept in `results` for join() to return; a long-lived
+    pipeline should pass collect_results=False and rely on `on_result` alone.
+    """
+
+    def __init__(self, stages, on_result=None, collect_results: bool = True):
+        self.stages = list(stages)
+        self.on_result = on_result
+        self.collect_results = collect_results
+        self.stats = [StageStats(stage.name) for stage in self.stages]
+        self.results = []
+
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        self._alive = [stage.workers for stage in self.stages]
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._pools: dict[int, ProcessPoolExecutor] = {}
+
+    def start(self) -> "Pipeline":
+        for index, stage in enumerate(self.stages):
+            if stage.processes:
+                self._pools[index] = self._make_pool(stage)
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return self
+
+    def submit(self, job: dict) -> None:
+        """Queue a job; blocks while the first stage is saturated."""
+        self._put(-1, job)
+
+    def close(self) -> None:
+        """Signal that no more jobs will be submitted."""
+        self._queues[0].put(_DONE)
+
+    def join(self) -> list:
+        for thread in self._threads:
+            thread.join()
+        for pool in self._pools.values():
+            pool.shutdown()
+        return self.results
+
+    def run(self, jobs) -> list:
+        self.start()
+        for job in jobs:
+            self.submit(job)
+        self.close()
+        return self.join()
+
+    def report(self) -> str:
+        lines = [f"{'stage':<12}{'done':>6}{'failed':>8}{'busy s':>10}{'starved s':>11}{'blocked s':>11}{'max q':>7}"]
+        for s in self.stats:
+            lines.append(
+                f"{s.name:<12}{s.processed:>6}{s.failed:>8}{s.busy:>10.1f}{s.starved:>11.1f}{s.blocked:>11.1f}{s.max_depth:>7}"
+            )
+        return "\n".join(lines)
+
+    def _put(self, index: int, job: dict) -> None:
+        """Hand a job to stage index + 1, accounting the wait as backpressure on stage index."""
+        target = self._queues[index + 1]
+        start = time.perf_counter()
+        target.put(job)
+        with self._lock:
+            if index >= 0:
+                self.stats[index].blocked += time.perf_counter() - start
+            downstream = self.stats[index + 1]
+            downstream.max_depth = max(downstream.max_depth, target.qsize())
+
+    @staticmethod
+    def _make_pool(stage: Stage) -> ProcessPoolExecutor:
+        # spawn, not fork: other stages hold threads (and possibly a loaded model)
+        pool = ProcessPoolExecutor(
+            max_workers=stage.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=stage.initializer,
+        )
+        # spawn the workers now, so their imports and initializer overlap the earlier stages
+        pool.submit(_noop)
+        return pool
+
+    def _replace_pool(self, index: int, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Swaps in a fresh pool for stage index, unless a sibling worker already did."""
+        with self._lock:
+            if self._pools[index] is broken:
+                print(f"[WARN] A {self.stages[index].name} worker process died; starting a new pool")
+                self._pools[index] = self._make_pool(self.stages[index])
+                broken.shutdown(wait=False)
+            return self._pools[index]
+
+    def _run_in_pool(self, index: int, job: dict):
+        pool = self._pools[index]
+        try:
+            future = pool.submit(self.stages[index].func, job)
+        except BrokenProcessPool:
+            # another job took the pool down before it was replaced; this one never ran
+            pool = self._replace_pool(index, pool)
+            future = pool.submit(self.stages[index].func, job)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._replace_pool(index, pool)
+            raise
+
+    def _finish(self, job: dict) -> None:
+        if self.collect_results:
+            with self._lock:
+                self.results.append(job)
+        if self.on_result:
+            try:
+                self.on_result(job)
+            except Exception as e:
+                # a worker that dies here never passes _DONE on, and join() would hang
+                print(f"[ERROR] on_result failed for {job.get('url')}: {e}")
+
+    def _work(self, index: int) -> None:
+        stage = self.stages[index]
+        stats = self.stats[index]
+        inbox = self._queues[index]
+        is_last = index == len(self.stages) - 1
+
+        while True:
+            start = time.perf_counter()
+            job = inbox.get()
+            with self._lock:
+                stats.starved += time.perf_counter() - start
+
+            if job is _DONE:
+                # leave the sentinel for the sibling workers of this stage
+                inbox.put(_DONE)
+                break
+
+            start = time.perf_counter()
+            try:
+                with tracing.span(stage.name, kind="stage", url=job.get("url"), submission_id=job.get("submission_id")):
+                    if stage.processes:
+                        job = self._run_in_pool(index, job)
+                    else:
+                        job = stage.func(job)
+            except (Exception, SystemExit) as e:
+                # SystemExit too: a stage calling sys.exit() must only take its own job down
+                with self._lock:
+                    stats.failed += 1
+                    stats.busy += time.perf_counter() - start
+                job["error"] = e
+                job["failed_stage"] = stage.name
+                self._finish(job)
+                continue
+
+            with self._lock:
+                stats.processed += 1
+                stats.busy += time.perf_counter() - start
+
+            for out in job if isinstance(job, list) else [job]:
+                if is_last:
+                    self._finish(out)
+                else:
+                    self._put(index, out)
+
+        # the last worker of a stage to leave tells the next stage there is nothing more coming
+        with self._lock:
+            self._alive[index] -= 1
+            propagate = self._alive[index] == 0 and not is_last
+        if propagate:
+            self._queues[index + 1].put(_DONE)
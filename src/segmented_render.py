@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import encoder
+import ffmpeg_binaries
+from ffmpeg_render import write_fd
+
+
+def segment_frames(cuts, total_duration: float, fps: int, segment_seconds: float) -> list[tuple[int, int]]:
+    """
+    Splits the timeline into [start, end) frame ranges: at every time in `cuts`
+    (e.g. the intro/body boundary) and then every `segment_seconds`. Boundaries are
+    whole frames so every segment starts on its own keyframe.
+    """
+    total_frames = int(total_duration * fps)
+    step = max(1, int(segment_seconds * fps))
+    boundaries = {0, total_frames}
+    for cut in cuts:
+        boundaries.add(min(total_frames, max(0, round(cut * fps))))
+    cut_points = sorted(boundaries)
+    for start, end in zip(cut_points[:-1], cut_points[1:]):
+        boundaries.update(range(start + step, end, step))
+    ordered = sorted(boundaries)
+    return list(zip(ordered[:-1], ordered[1:]))
+
+
+def concat_and_mux(segment_paths, soundtrack: np.ndarray, sample_rate: int, output_path: Path,
+                   encoder_profile: dict = None) -> None:
+    """Joins the segments with the concat demuxer (no re-encode) and muxes the soundtrack once."""
+    list_path = Path(segment_paths[0]).parent / "segments.txt"
+    list_path.write_text("".join(f"file '{Path(p).resolve()}'\n" for p in segment_paths))
+
+    audio_read, audio_write = os.pipe()
+    command = [
+        ffmpeg_binaries.ffmpeg(), "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", str(list_path),
+        "-f", "f32le", "-ar", str(sample_rate), "-ac", str(soundtrack.shape[1]), "-i", f"pipe:{audio_read}",
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "copy", *encoder.audio_args(encoder_profile or encoder.ENCODER_PROFILES[encoder.DEFAULT_PROFILE]),
+        str(output_path),
+    ]
+    process = subprocess.Popen(command, stderr=subprocess.PIPE, pass_fds=(audio_read,))
+    os.close(audio_read)
+    audio_writer = threading.Thread(
+        target=write_fd, args=(audio_write, np.ascontiguousarray(soundtrack, dtype=np.float32)), daemon=True
+    )
+    audio_writer.start()
+    audio_writer.join()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg concat failed for {output_path}: {process.stderr.read().decode(errors='replace')}")
+
+
+def render_segmented(render_segment, plan: dict, soundtrack: np.ndarray, output_path: Path, fps: int,
+                     cuts=(), segment_seconds: float = 15.0, workers: int = None, sample_rate: int = 44100) -> None:
+    """
+    Renders the video in parallel pieces and joins them losslessly.
+
+    `render_segment(plan, start_frame, end_frame, path)` must be a picklable top-level
+    function that writes frames [start_frame, end_frame) of the video described by
+    `plan`, without audio, with the same encoder settings for every segment.
+    """
+    frames = segment_frames(cuts, plan["total_duration"], fps, segment_seconds)
+    work_dir = Path(tempfile.mkdtemp(prefix=f"{Path(output_path).stem}_", dir=Path(output_path).parent))
+    try:
+        segment_paths = [work_dir / f"segment_{i:04d}.mp4" for i in range(len(frames))]
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            futures = [
+                pool.submit(render_segment, plan, start, end, str(path))
+                for (start, end), path in zip(frames, segment_paths)
+            ]
+            for future in futures:
+                future.result()
+        concat_and_mux(segment_paths, soundtrack, sample_rate, output_path, plan.get("encoder"))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,196 @@
+import os
+import random
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from animation import ScaleAnimation
+
+# Byte budget of this process's sprite and bounce caches together, unless SUBTITLE_CACHE_BYTES
+# says otherwise (main.py sets it to each render process's share of SUBTITLE_CACHE_MB).
+# Sprites are width * height * 4 bytes, 200-300 KB for a word or pair at subtitle size; a
+# word's bounce is ~6 resampled frames at 60 fps plus its resting sprite, 1.5-2 MB. The
+# sprites get a third of the budget and the animations the rest.
+DEFAULT_CACHE_BYTES = 384 * 1024 * 1024
+BOUNCE_DURATION = 0.1
+
+
+@lru_cache(maxsize=16)
+def load_font(font: str, size: int) -> ImageFont.FreeTypeFont:
+    """Resolves a font by name (as ImageMagick would) or by file path, once per process."""
+    return ImageFont.truetype(font, size)
+
+
+def cache_bytes() -> int:
+    # read on use, not at import, so the budget main.py's config sets still applies here
+    return int(os.environ.get("SUBTITLE_CACHE_BYTES") or DEFAULT_CACHE_BYTES)
+
+
+class ByteLRU:
+    """
+    Thread-safe least-recently-used cache bounded by the total `nbytes` of its values.
+    `max_bytes` is a number, or a function returning one, checked on every insert.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """The cached value for key, calling build() to make it on a miss."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        value = build()  # outside the lock, so other keys aren't held up
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = value
+                self.nbytes += value.nbytes
+                limit = self.max_bytes() if callable(self.max_bytes) else self.max_bytes
+                # always keep the newest entry, even if it alone is over the limit
+                while self.nbytes > limit and len(self._items) > 1:
+                    _, evicted = self._items.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+            return self._items[key]
+
+
+_sprites = ByteLRU(lambda: cache_bytes() // 3)
+_animations = ByteLRU(lambda: cache_bytes() - cache_bytes() // 3)
+
+
+def render_word_sprite(text: str, font: str, size: int, stroke: int) -> np.ndarray:
+    """
+    Rasterizes a subtitle word in-process into one RGBA sprite: a black stroked shadow
+    with the white fill drawn on top of it.
+
+    Cached on (text, font, size, stroke), so repeated words are only drawn once per
+    process. The returned array is shared between callers and marked read-only.
+    """
+    return _sprites.get((text, font, size, stroke), lambda: _draw_word(text, font, size, stroke))
+
+
+def _draw_word(text: str, font: str, size: int, stroke: int) -> np.ndarray:
+    face = load_font(font, size)
+    left, top, right, bottom = face.getbbox(text, stroke_width=stroke)
+    width = max(1, right - left)
+    height = max(1, bottom - top)
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    origin = (-left, -top)
+    draw.text(origin, text, font=face, fill="black", stroke_width=stroke, stroke_fill="black")
+    draw.text(origin, text, font=face, fill="white")
+
+    sprite = np.asarray(image)
+    sprite.setflags(write=False)
+    return sprite
+
+
+def bounce(t: float) -> float:
+    """Quick pop at the beginning of each word."""
+    return 1.1 + 0.1 * (1 - (t / BOUNCE_DURATION) ** 2) if t <= BOUNCE_DURATION else 1.0
+
+
+def bouncing_word(text: str, font: str, size: int, stroke: int, fps: int) -> ScaleAnimation:
+    """Pre-rendered bounce frames for a word, kept for the most recent words within the cache budget."""
+    return _animations.get(
+        (text, font, size, stroke, fps),
+        lambda: ScaleAnimation(render_word_sprite(text, font, size, stroke), bounce, BOUNCE_DURATION, fps),
+    )
+
+
+def group_words(transcribed_text, pair_chance: float = 0.3, rng=random) -> list[tuple[float, float, str]]:
+    """
+    Flattens whisper_timestamped segments into (start, end, text) subtitle events,
+    occasionally pairing two words into one event.
+    """
+    events = []
+    for segment in transcribed_text.get("segments", []):
+        words = segment.get("words", [])
+        i = 0
+        while i < len(words):
+            word_group = words[i:i + 2] if rng.random() < pair_chance else words[i:i + 1]
+            text = " ".join(word["text"] for word in word_group).strip()
+            events.append((float(word_group[0]["start"]), float(word_group[-1]["end"]), text))
+            i += len(word_group)
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+def blit_rgba(frame: np.ndarray, sprite: np.ndarray, center=None) -> np.ndarray:
+    """Alpha-composites an RGBA sprite onto an RGB(A) frame, centered unless told otherwise."""
+    frame_h, frame_w = frame.shape[:2]
+    sprite_h, sprite_w = sprite.shape[:2]
+    cx, cy = center if center else (frame_w // 2, frame_h // 2)
+    x0, y0 = cx - sprite_w // 2, cy - sprite_h // 2
+
+    # clip the sprite to the frame
+    fx0, fy0 = max(0, x0), max(0, y0)
+    fx1, fy1 = min(frame_w, x0 + sprite_w), min(frame_h, y0 + sprite_h)
+    if fx0 >= fx1 or fy0 >= fy1:
+        return frame
+    patch = sprite[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0]
+
+    if not frame.flags.writeable:
+        frame = frame.copy()
+    region = frame[fy0:fy1, fx0:fx1]
+    alpha = patch[..., 3:4].astype(np.float32) / 255.0
+    src = patch[..., :3].astype(np.float32)
+    dst = region[..., :3].astype(np.float32)
+    if region.shape[2] == 3:
+        region[...] = (src * alpha + dst * (1.0 - alpha)).astype(np.uint8)
+    else:
+        # straight-alpha "over" so sprites keep their colour on a transparent canvas
+        dst_alpha = region[..., 3:4].astype(np.float32) / 255.0
+        out_alpha = alpha + dst_alpha * (1.0 - alpha)
+        rgb = (src * alpha + dst * dst_alpha * (1.0 - alpha)) / np.maximum(out_alpha, 1e-6)
+        region[..., :3] = rgb.astype(np.uint8)
+        region[..., 3:4] = (out_alpha * 255.0).astype(np.uint8)
+    return frame
+
+
+class SubtitleTrack:
+    """
+    Word timings indexed by start time. Each frame looks up the single active event
+    with a bisect and blits only that sprite, so frame cost doesn't grow with the
+    number of words in the post.
+    """
+
+    def __init__(self, events, font: str, size: int, stroke: int, fps: int = 60):
+        self.events = sorted(events, key=lambda event: event[0])
+        self._starts = [event[0] for event in self.events]
+        self.font = font
+        self.size = size
+        self.stroke = stroke
+        self.fps = fps
+
+    def max_sprite_height(self) -> int:
+        """Upper bound on a sprite's height, including the stroke and the bounce overshoot."""
+        ascent, descent = load_font(self.font, self.size).getmetrics()
+        return int((ascent + descent + 2 * self.stroke) * bounce(0)) + 1
+
+    def active(self, t: float):
+        i = bisect_right(self._starts, t) - 1
+        if i >= 0 and t < self.events[i][1]:
+            return self.events[i]
+        return None
+
+    def sprite_at(self, t: float):
+        event = self.active(t)
+        if event is None:
+            return None
+        start, _, text = event
+        return bouncing_word(text, self.font, self.size, self.stroke, self.fps).frame(t - start)
+
+    def blit(self, frame: np.ndarray, t: float) -> np.ndarray:
+        sprite = self.sprite_at(t)
+        if sprite is None:
+            return frame
+        return blit_rgba(frame, sprite)
@@ -0,0 +1,120 @@
+"""
+Rule-based text rewriting (abbreviation expansion, censoring) in a single regex pass.
+
+Rules come from lexicon files in LEXICON_DIR, one `<regex><TAB><replacement>` per
+line (see data/lexicons). Every lexicon requested together is compiled into one
+alternation, so a text is scanned once however many rules there are. Plain word
+rules such as `\\bfuck\\b` are merged into a prefix trie and resolved with a dict
+lookup, so long word lists don't grow the pattern linearly. Compiled matchers are
+cached per process.
+"""
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+LEXICON_DIR = Path(os.environ.get("LEXICON_DIR", "../data/lexicons"))
+
+_LITERAL_WORD = re.compile(r"\\b([\w']+)\\b")
+# \1 or \g<1> in a replacement template
+_GROUP_REFERENCE = re.compile(r"\\(?:(\d+)|g<(\d+)>)")
+
+
+def load_lexicon(path: Path) -> tuple[bool, list[tuple[str, str]]]:
+    """(ignore_case, [(pattern, replacement), ...]) from a lexicon file."""
+    ignore_case = False
+    rules = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if line.strip() == "#!ignorecase":
+            ignore_case = True
+        elif line.strip() and not line.startswith("#"):
+            pattern, _, replacement = line.partition("\t")
+            rules.append((pattern, replacement))
+    return ignore_case, rules
+
+
+def _trie_pattern(words) -> str:
+    """A regex matching exactly `words`, with shared prefixes factored out."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        # a word ending here makes the longer continuations optional
+        return f"(?:{'|'.join(branches)})" + ("?" if "" in node else "")
+
+    return build(trie)
+
+
+def _shift_template(template: str, offset: int) -> str:
+    # a rule's own group N is group offset + N of the combined pattern
+    return _GROUP_REFERENCE.sub(lambda m: f"\\g<{offset + int(m.group(1) or m.group(2))}>", template)
+
+
+class Rewriter:
+    """
+    Applies the rules of several lexicons in one pass. Where rules from different
+    lexicons could match at the same place, the earlier lexicon wins.
+    """
+
+    def __init__(self, lexicons):
+        alternatives = []
+        self._actions = {}  # outer group index -> template string, or a word -> replacement dict
+        group = 0
+
+        def add(pattern: str, action, ignore_case: bool) -> None:
+            nonlocal group
+            scoped = f"(?i:{pattern})" if ignore_case else f"(?:{pattern})"
+            alternatives.append(f"({scoped})")
+            group += 1
+            self._actions[group] = (action, ignore_case)
+            group += re.compile(pattern).groups
+
+        for ignore_case, rules in lexicons:
+            words = {}
+            patterns = []
+            for pattern, replacement in rules:
+                literal = _LITERAL_WORD.fullmatch(pattern)
+                if literal and not _GROUP_REFERENCE.search(replacement):
+                    word = literal.group(1).lower() if ignore_case else literal.group(1)
+                    words.setdefault(word, replacement)
+                else:
+                    patterns.append((pattern, replacement))
+            if words:
+                add(rf"\b{_trie_pattern(words)}\b", words, ignore_case)
+            for pattern, replacement in patterns:
+                add(pattern, _shift_template(replacement, group + 1), ignore_case)
+
+        self.pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def _replace(self, match: re.Match) -> str:
+        # the outer group of an alternative closes after its inner groups, so it is lastindex
+        action, ignore_case = self._actions[match.lastindex]
+        if isinstance(action, dict):
+            text = match.group(match.lastindex)
+            return action[text.lower() if ignore_case else text]
+        return match.expand(action)
+
+    def __call__(self, text: str) -> str:
+        if self.pattern is None or not text:
+            return text
+        return self.pattern.sub(self._replace, text)
+
+
+@lru_cache(maxsize=16)
+def rewriter(names: tuple[str, ...], lexicon_dir: Path = LEXICON_DIR) -> Rewriter:
+    """The compiled rules of the named lexicons (`<name>.tsv`), built once per process."""
+    return Rewriter([load_lexicon(Path(lexicon_dir) / f"{name}.tsv") for name in names])
+
+
+def rewrite(text: str, *names: str) -> str:
+    """Applies the named lexicons to text in a single pass, e.g. rewrite(title, "expansions", "censor")."""
+    return rewriter(names)(text)
@@ -3,8 +3,11 @@
 # topic: TikTok-Voice-TTS
 # version: 1.2
 
-import requests, base64, re, sys
-from threading import Thread
+import requests, base64, re, os, hashlib, time, tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from pathlib import Path
+from requests.adapters import HTTPAdapter
 
 # define the endpoint data with URLs and corresponding response keys
 ENDPOINT_DATA = [
@@ -22,6 +25,24 @@ ENDPOINT_DATA = [
     }
 ]
 
+# local cache of decoded audio per chunk, keyed on (voice, chunk text, endpoint)
+CACHE_DIR = Path(os.environ.get("TTS_CACHE_DIR", "../data/cache/tts"))
+CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# eviction trims down to this share of CACHE_MAX_BYTES, so it doesn't rerun on every write
+CACHE_EVICT_TO = 0.9
+# serve only from the cache, never touch the network
+OFFLINE = os.environ.get("TTS_OFFLINE", "") not in ("", "0")
+
+_cache_lock = Lock()
+# running size of the cache as this process sees it; None until the first write scans it
+_cache_bytes = None
+
+# HTTP client tuning
+MAX_WORKERS = 16        # chunks synthesized concurrently
+REQUEST_TIMEOUT = 20    # seconds
+RETRIES = 3
+BACKOFF = 0.5           # seconds, doubled on every retry
+
 # define available voices for text-to-speech conversion
 VOICES = [
     # DISNEY VOICES
@@ -74,8 +95,210 @@ VOICES = [
     'en_female_emotional',         # peaceful
 ]
 
+def _cache_path(voice: str, chunk: str, endpoint_url: str) -> Path:
+    key = hashlib.sha256(f"{voice}\0{endpoint_url}\0{chunk}".encode()).hexdigest()
+    return CACHE_DIR / key[:2] / f"{key}.mp3"
+
+def _cache_get(voice: str, chunk: str, endpoint_url: str):
+    path = _cache_path(voice, chunk, endpoint_url)
+    try:
+        audio_bytes = path.read_bytes()
+    except OSError:
+        return None
+    # touch so eviction treats it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return audio_bytes
+
+def _cache_put(voice: str, chunk: str, endpoint_url: str, audio_bytes: bytes) -> None:
+    path = _cache_path(voice, chunk, endpoint_url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # unique per call: threads writing the same chunk must not share a temp file
+    fd, tmp_name = tempfile.mkstemp(suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(audio_bytes)
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+        os.replace(tmp_name, path)
+    except OSError:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _cache_entries())
+        else:
+            _cache_bytes += len(audio_bytes) - replaced
+        if _cache_bytes > CACHE_MAX_BYTES:
+            _cache_evict()
+
+def _cache_entries() -> list:
+    entries = []
+    for path in CACHE_DIR.glob("*/*.mp3"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+def _cache_evict() -> None:
+    # drop least recently used chunks until the cache is back under CACHE_EVICT_TO of the limit.
+    # Called with _cache_lock held; rescanning here also picks up what other processes wrote.
+    global _cache_bytes
+    entries = _cache_entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= CACHE_MAX_BYTES * CACHE_EVICT_TO:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+    _cache_bytes = total
+
+class TTSError(Exception):
+    pass
+
+class TTSClient:
+    """
+    Shared-session TTS client. Chunks run on a bounded worker pool; each chunk goes to
+    the healthiest endpoint first and, if that is slower than it usually is, is raced
+    against the next one. Endpoint health is an EWMA of latency and failure rate.
+    """
+
+    def __init__(self, endpoints: list = None, max_workers: int = MAX_WORKERS, timeout: float = REQUEST_TIMEOUT,
+                 retries: int = RETRIES, backoff: float = BACKOFF, hedge_after: float = None):
+        self.endpoints = endpoints if endpoints is not None else ENDPOINT_DATA
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # fixed hedge delay; by default it follows each endpoint's own latency
+        self.hedge_after = hedge_after
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=2 * max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._chunk_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-chunk")
+        # separate pool so hedged requests never wait behind the chunks that issued them; each
+        # chunk can end up with a request in flight on every endpoint at once
+        self._request_pool = ThreadPoolExecutor(
+            max_workers=max_workers * max(1, len(self.endpoints)), thread_name_prefix="tts-request"
+        )
+
+        self._health_lock = Lock()
+        self.health = {entry["url"]: {"latency": 1.0, "failure_rate": 0.0} for entry in self.endpoints}
+
+    def _record(self, url: str, latency: float, ok: bool) -> None:
+        with self._health_lock:
+            health = self.health[url]
+            health["latency"] = 0.7 * health["latency"] + 0.3 * latency
+            health["failure_rate"] = 0.7 * health["failure_rate"] + 0.3 * (0.0 if ok else 1.0)
+
+    def ranked(self) -> list:
+        """Endpoints from healthiest to least healthy."""
+        with self._health_lock:
+            score = {url: h["latency"] * (1 + 4 * h["failure_rate"]) for url, h in self.health.items()}
+        return sorted(self.endpoints, key=lambda entry: score[entry["url"]])
+
+    def _request(self, entry: dict, voice: str, chunk: str) -> bytes:
+        start = time.perf_counter()
+        try:
+            response = self.session.post(entry["url"], json={"text": chunk, "voice": voice}, timeout=self.timeout)
+            if response.status_code != 200:
+                raise TTSError(f"{entry['url']} returned HTTP {response.status_code}")
+            data = response.json().get(entry["response"])
+            if not data:
+                raise TTSError(f"{entry['url']} returned no audio")
+            audio_bytes = base64.b64decode(data)
+        except (requests.RequestException, ValueError, TTSError):
+            self._record(entry["url"], time.perf_counter() - start, ok=False)
+            raise
+        self._record(entry["url"], time.perf_counter() - start, ok=True)
+        try:
+            _cache_put(voice, chunk, entry["url"], audio_bytes)
+        except OSError as e:
+            # the request itself succeeded; caching is best-effort
+            print(f"[WARN] Could not cache TTS chunk from {entry['url']}: {e}")
+        return audio_bytes
+
+    def _hedge_delay(self, entry: dict) -> float:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        with self._health_lock:
+            return max(0.2, 2 * self.health[entry["url"]]["latency"])
+
+    def _race(self, voice: str, chunk: str) -> bytes:
+        """One attempt: healthiest endpoint first, the next one joins whenever the leader is slow or fails."""
+        candidates = self.ranked()
+        pending = set()
+        errors = []
+        launched = 0
+
+        def launch() -> None:
+            nonlocal launched
+            pending.add(self._request_pool.submit(self._request, candidates[launched], voice, chunk))
+            launched += 1
+
+        launch()
+        while pending:
+            timeout = self._hedge_delay(candidates[launched - 1]) if launched < len(candidates) else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                errors.append(future.exception())
+            if not pending and launched < len(candidates):
+                launch()
+        raise TTSError(f"all endpoints failed: {errors}")
+
+    def synthesize_chunk(self, voice: str, chunk: str, offline: bool = False) -> bytes:
+        for entry in self.ranked():
+            cached = _cache_get(voice, chunk, entry["url"])
+            if cached is not None:
+                return cached
+        if offline:
+            raise TTSError(f"offline mode: chunk not cached for voice '{voice}': {chunk[:40]!r}")
+
+        for attempt in range(self.retries):
+            try:
+                return self._race(voice, chunk)
+            except TTSError:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def synthesize(self, chunks: list, voice: str, offline: bool = False) -> bytes:
+        futures = [self._chunk_pool.submit(self.synthesize_chunk, voice, chunk, offline) for chunk in chunks]
+        return b"".join(future.result() for future in futures)
+
+    def close(self) -> None:
+        self._chunk_pool.shutdown()
+        self._request_pool.shutdown()
+        self.session.close()
+
+_default_client = None
+_default_client_lock = Lock()
+
+def default_client() -> TTSClient:
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = TTSClient()
+        return _default_client
+
 # define the text-to-speech function
-def tts(text: str, voice: str, output_filename: str = "output.mp3", play_sound: bool = False):
+def tts(text: str, voice: str, output_filename: str = "output.mp3", play_sound: bool = False, offline: bool = None,
+        client: TTSClient = None):
     # specified voice is valid
     if not voice in VOICES:
         raise ValueError("voice must be valid")
@@ -83,65 +306,18 @@ def tts(text: str, voice: str, output_filename: str = "output.mp3", play_sound:
     # text is not empty
     if not text:
         raise ValueError("text must not be 'None'")
-    
-    # split the text into chunks
-    chunks: list[str] = _split_text(text)
 
-    for entry in ENDPOINT_DATA:
-        endpoint_valid: bool = True
+    if offline is None:
+        offline = OFFLINE
 
-        # empty list to store the data from the reqeusts
-        audio_data: list[str] = ["" for i in range(len(chunks))]
-
-        # generate audio for each chunk in a separate thread
-        def generate_audio_chunk(index: int, chunk: str) -> None:
-            nonlocal endpoint_valid
-
-            if not endpoint_valid: return
+    # split the text into chunks and synthesize them concurrently; raises TTSError on failure
+    chunks: list[str] = _split_text(text)
+    audio_bytes = (client or default_client()).synthesize(chunks, voice, offline=offline)
 
-            try:
-                # request to the endpoint to generate audio for the chunk
-                response = requests.post(
-                    entry["url"], 
-                    json={
-                        "text": chunk,
-                        "voice": voice
-                    }
-                )
-
-                if response.status_code == 200:
-                    # store the audio data for the chunk
-                    audio_data[index] = response.json()[entry["response"]]
-                else:
-                    endpoint_valid = False
-
-            except requests.RequestException as e:
-                print(f"Error: {e}")
-                sys.exit()
-
-        # start threads for generating audio for each chunk
-        threads: list[Thread] = []
-        for index, chunk in enumerate(chunks):
-            thread: Thread = Thread(target=generate_audio_chunk, args=(index, chunk))
-            threads.append(thread)
-            thread.start()
-
-        # wait for all threads to finish
-        for thread in threads:
-            thread.join()
-        
-        if not endpoint_valid: continue
-
-        # concatenate audio data from all chunks and decode from base64
-        audio_bytes = base64.b64decode("".join(audio_data))
-
-        # write the audio data to a file
-        with open(output_filename, "wb") as file:
-            file.write(audio_bytes)
-            print(f"File '{output_filename}' has been generated successfully.")
-        
-        # break after processing a valid endpoint
-        break
+    # write the audio data to a file
+    with open(output_filename, "wb") as file:
+        file.write(audio_bytes)
+        print(f"File '{output_filename}' has been generated successfully.")
     return output_filename
 
 # define a function to split the text into chunks of maximum 300 characters or less
@@ -0,0 +1,140 @@
+"""
+Timing spans for the pipeline, written as JSON lines and optionally as a Chrome
+trace (open it in chrome://tracing or ui.perfetto.dev).
+
+Tracing is configured through environment variables, so spawned render workers
+pick up the same settings as the process that started them:
+
+    TRACE_METRICS       JSON-lines file, one record per span
+    TRACE_CHROME        Chrome trace file
+    TRACE_FRAME_SAMPLE  time every Nth frame of a render (0: off)
+
+With none of them set, spans cost a dictionary lookup.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+_write_lock = threading.Lock()
+
+
+def configure(metrics_path: Path = None, chrome_path: Path = None, frame_sample: int = 0) -> None:
+    """Turns tracing on for this process and every process it starts from now on."""
+    if metrics_path:
+        os.environ["TRACE_METRICS"] = str(metrics_path)
+    if chrome_path:
+        chrome_path = Path(chrome_path)
+        # an unterminated JSON array is valid trace format, so processes can keep appending
+        chrome_path.write_text("[\n")
+        os.environ["TRACE_CHROME"] = str(chrome_path)
+    os.environ["TRACE_FRAME_SAMPLE"] = str(frame_sample)
+
+
+def enabled() -> bool:
+    return bool(os.environ.get("TRACE_METRICS") or os.environ.get("TRACE_CHROME"))
+
+
+def frame_sample() -> int:
+    return int(os.environ.get("TRACE_FRAME_SAMPLE") or 0) if enabled() else 0
+
+
+def _append(path: str, line: str) -> None:
+    # one write per line in append mode, so lines from several processes don't interleave
+    with _write_lock, open(path, "a") as file:
+        file.write(line)
+
+
+def emit(name: str, start: float, duration: float, attrs: dict = None) -> None:
+    """
+    Records a finished span; `start` is a time.time() timestamp, so processes share a
+    clock. `attrs` is a plain dict so any key is allowed; in the JSON-lines record the
+    span's own fields win over attributes of the same name.
+    """
+    metrics_path = os.environ.get("TRACE_METRICS")
+    chrome_path = os.environ.get("TRACE_CHROME")
+    if not (metrics_path or chrome_path):
+        return
+    pid, tid = os.getpid(), threading.get_ident()
+    attrs = {
+        key: value if isinstance(value, (int, float, bool, type(None))) else str(value)
+        for key, value in (attrs or {}).items()
+    }
+    if metrics_path:
+        record = {**attrs, "name": name, "start": round(start, 6), "duration": round(duration, 6), "pid": pid, "tid": tid}
+        _append(metrics_path, json.dumps(record) + "\n")
+    if chrome_path:
+        event = {
+            "name": name, "ph": "X", "ts": int(start * 1e6), "dur": int(duration * 1e6),
+            "pid": pid, "tid": tid, "args": attrs,
+        }
+        _append(chrome_path, json.dumps(event) + ",\n")
+
+
+@contextmanager
+def span(name: str, /, **attrs):
+    """Times the enclosed block; the span is recorded even if the block raises."""
+    if not enabled():
+        yield
+        return
+    start = time.time()
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        emit(name, start, time.perf_counter() - begin, attrs)
+
+
+class FrameSampler:
+    """
+    Per-frame cost of a render, for every `every`th frame, split into background
+    decode, compositing and encode.
+
+    Wrap the background's frame source with `decode` and the finished clip's with
+    `frame`. Renderers ask for frames in order and encode each one before asking for
+    the next, so the time until the next `frame` call is that frame's encode time.
+    Call `close` after the last frame to record it.
+    """
+
+    def __init__(self, name: str, every: int, /, **attrs):
+        self.name = name
+        self.every = max(1, every)
+        self.attrs = attrs
+        self._index = 0
+        self._decode = 0.0
+        self._pending = None
+        self._returned = 0.0
+
+    def decode(self, get_frame, t):
+        start = time.perf_counter()
+        frame = get_frame(t)
+        self._decode += time.perf_counter() - start
+        return frame
+
+    def frame(self, get_frame, t):
+        if self._pending is not None:
+            self._flush(time.perf_counter() - self._returned)
+        start = time.perf_counter()
+        wall = time.time()
+        self._decode = 0.0
+        frame = get_frame(t)
+        end = time.perf_counter()
+        if self._index % self.every == 0:
+            self._pending = (wall, end - start, dict(
+                frame=self._index, t=round(t, 4),
+                decode=round(self._decode, 6), composite=round(end - start - self._decode, 6),
+            ))
+        self._index += 1
+        self._returned = time.perf_counter()
+        return frame
+
+    def _flush(self, encode) -> None:
+        wall, duration, attrs = self._pending
+        self._pending = None
+        emit(self.name, wall, duration, {"encode": None if encode is None else round(encode, 6), **attrs, **self.attrs})
+
+    def close(self) -> None:
+        if self._pending is not None:
+            self._flush(time.perf_counter() - self._returned)
@@ -0,0 +1,344 @@
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import audio
+import tracing
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.01
+MIN_PAUSE_SECONDS = 0.12
+# below this share of phrase breaks landing on a real pause, alignment is not trusted
+MIN_ALIGN_CONFIDENCE = 0.6
+# long tracks are cut at silences into pieces of at most this length and decoded in parallel
+CHUNK_SECONDS = 30.0
+
+
+def audio_key(samples: np.ndarray, model_name: str) -> str:
+    """Content address of a transcript: the audio samples plus whatever produced the timings."""
+    digest = hashlib.sha256(np.ascontiguousarray(samples).tobytes())
+    digest.update(model_name.encode())
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """Word-timestamp results on disk, one JSON file per content key."""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str):
+        path = self.cache_dir / f"{key}.json"
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text())
+        except ValueError:
+            return None
+
+    def put(self, key: str, transcript: dict) -> None:
+        path = self.cache_dir / f"{key}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(transcript))
+        tmp_path.replace(path)
+
+
+def load_samples(audio_path: Path, speed: float = 1.0) -> np.ndarray:
+    """Mono 16 kHz float32 samples, the layout both the aligner and Whisper expect."""
+    return audio.decode(audio_path, SAMPLE_RATE, channels=1, speed=speed)[:, 0]
+
+
+def _voiced_frames(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    frame = max(1, int(sample_rate * FRAME_SECONDS))
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    energy = np.sqrt(np.mean(samples[:count * frame].reshape(count, frame) ** 2, axis=1))
+    threshold = max(1e-4, 0.1 * np.percentile(energy, 95))
+    return energy > threshold
+
+
+def _pauses(voiced: np.ndarray) -> tuple[float, float, list[tuple[float, float]]]:
+    """Speech start/end and the silent gaps in between, in seconds."""
+    indices = np.flatnonzero(voiced)
+    if len(indices) == 0:
+        return 0.0, 0.0, []
+    first, last = int(indices[0]), int(indices[-1]) + 1
+
+    min_frames = int(MIN_PAUSE_SECONDS / FRAME_SECONDS)
+    pauses = []
+    run_start = None
+    for i in range(first, last):
+        if not voiced[i]:
+            if run_start is None:
+                run_start = i
+        elif run_start is not None:
+            if i - run_start >= min_frames:
+                pauses.append((run_start * FRAME_SECONDS, i * FRAME_SECONDS))
+            run_start = None
+    return first * FRAME_SECONDS, last * FRAME_SECONDS, pauses
+
+
+def _weight(word: str) -> float:
+    # roughly proportional to spoken length; the constant covers very short words
+    return len(re.sub(r"\W", "", word)) + 2.0
+
+
+def _spread_words(words: list[str], start: float, end: float) -> list[dict]:
+    weights = [_weight(word) for word in words]
+    scale = (end - start) / sum(weights)
+    timed = []
+    t = start
+    for word, weight in zip(words, weights):
+        timed.append({"text": word, "start": round(t, 3), "end": round(t + weight * scale, 3)})
+        t += weight * scale
+    return timed
+
+
+def align_text(text: str, samples: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    """
+    Forced alignment of text we already know (the string sent to TTS) against its audio.
+
+    Phrase breaks in the text are snapped to the nearest silent gap in the audio, then
+    words are spread across each phrase in proportion to their length. TTS speech is
+    regular enough for this to land close to Whisper's timings. Returns a
+    whisper_timestamped-shaped dict, or None when too few phrase breaks found a
+    matching pause for the result to be trusted. Text with no phrase breaks at all
+    gives nothing to check the spread against, so it is never trusted either.
+    """
+    phrases = [phrase.split() for phrase in re.findall(r"[^.,!?;:]+[.,!?;:]*", text)]
+    phrases = [phrase for phrase in phrases if phrase]
+    if not phrases:
+        return None
+
+    speech_start, speech_end, pauses = _pauses(_voiced_frames(samples, sample_rate))
+    if speech_end <= speech_start:
+        return None
+
+    # where each phrase boundary would fall if speech were perfectly uniform
+    weights = [sum(_weight(word) for word in phrase) for phrase in phrases]
+    total = sum(weights)
+    expected = []
+    acc = 0.0
+    for weight in weights[:-1]:
+        acc += weight
+        expected.append(speech_start + (speech_end - speech_start) * acc / total)
+
+    boundaries = []
+    snapped = 0
+    free = list(pauses)
+    for t in expected:
+        best = min(free, key=lambda pause: abs((pause[0] + pause[1]) / 2 - t), default=None)
+        # accept the pause if it is within a second and keeps boundaries in order
+        if best and abs((best[0] + best[1]) / 2 - t) < 1.0 and (not boundaries or best[0] >= boundaries[-1][1]):
+            boundaries.append(best)
+            free.remove(best)
+            snapped += 1
+        else:
+            t = max(t, boundaries[-1][1]) if boundaries else t
+            boundaries.append((t, t))
+
+    if not expected or snapped / len(expected) < MIN_ALIGN_CONFIDENCE:
+        return None
+
+    segments = []
+    edges = [(None, speech_start)] + boundaries + [(speech_end, None)]
+    for phrase, (_, start), (end, _) in zip(phrases, edges[:-1], edges[1:]):
+        end = max(end, start + 0.01)
+        segments.append(
+            {"text": " ".join(phrase), "start": round(start, 3), "end": round(end, 3), "words": _spread_words(phrase, start, end)}
+        )
+    return {"text": text, "segments": segments, "language": "en"}
+
+
+class WhisperTimestampedBackend:
+    """The original backend: whisper_timestamped on PyTorch, fp32 on CPU."""
+
+    # the model patches itself with hooks during a decode, so one decode at a time
+    parallel = False
+
+    def __init__(self, model_name: str = "medium", device: str = "cpu", compute_type: str = None, workers: int = 1):
+        self.model_name = model_name
+        self.device = device
+        self.model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def key(self) -> str:
+        return self.model_name
+
+    def load_model(self):
+        # imported here: whisper_timestamped pulls in torch, which is slow to import
+        import whisper_timestamped as whisper
+
+        with self._load_lock:
+            if self.model is None:
+                self.model = whisper.load_model(self.model_name, device=self.device)
+        return self.model
+
+    def transcribe(self, samples: np.ndarray) -> dict:
+        import whisper_timestamped as whisper
+
+        return whisper.transcribe(self.load_model(), samples, language="en")
+
+
+class FasterWhisperBackend:
+    """
+    faster-whisper (CTranslate2), with int8 weights by default. Several decodes can
+    run on one model at once, up to `workers`, which is what chunked transcription uses.
+    """
+
+    parallel = True
+
+    def __init__(self, model_name: str = "medium", device: str = "cpu", compute_type: str = "int8", workers: int = 1):
+        self.model_name = model_name
+        self.device = device
+        self.compute_type = compute_type
+        self.workers = max(1, workers)
+        self.model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def key(self) -> str:
+        return f"faster_whisper:{self.model_name}:{self.compute_type}"
+
+    def load_model(self):
+        from faster_whisper import WhisperModel
+
+        # chunks decoded on several threads would otherwise each load their own copy
+        with self._load_lock:
+            if self.model is None:
+                self.model = WhisperModel(
+                    self.model_name, device=self.device, compute_type=self.compute_type, num_workers=self.workers
+                )
+        return self.model
+
+    def transcribe(self, samples: np.ndarray) -> dict:
+        segments, _ = self.load_model().transcribe(samples, language="en", word_timestamps=True)
+        converted = []
+        for segment in segments:
+            words = [
+                {"text": word.word.strip(), "start": round(word.start, 3), "end": round(word.end, 3),
+                 "confidence": round(word.probability, 3)}
+                for word in segment.words or []
+            ]
+            converted.append(
+                {"text": segment.text.strip(), "start": round(segment.start, 3), "end": round(segment.end, 3), "words": words}
+            )
+        return {"text": " ".join(segment["text"] for segment in converted), "segments": converted, "language": "en"}
+
+
+BACKENDS = {
+    "whisper_timestamped": WhisperTimestampedBackend,
+    "faster_whisper": FasterWhisperBackend,
+}
+
+
+def silence_chunks(samples: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                   max_seconds: float = CHUNK_SECONDS) -> list[tuple[int, int]]:
+    """
+    Cuts a track into [start, end) sample ranges of at most `max_seconds`, in the
+    middle of the longest pause in the second half of each window, so no word is cut.
+    Falls back to a hard cut when a window has no pause at all.
+    """
+    total = len(samples) / sample_rate
+    if total <= max_seconds:
+        return [(0, len(samples))]
+    _, _, pauses = _pauses(_voiced_frames(samples, sample_rate))
+
+    cuts = []
+    position = 0.0
+    while total - position > max_seconds:
+        window = [p for p in pauses if position + max_seconds / 2 < (p[0] + p[1]) / 2 <= position + max_seconds]
+        if window:
+            start, end = max(window, key=lambda p: p[1] - p[0])
+            position = (start + end) / 2
+        else:
+            position += max_seconds
+        cuts.append(int(position * sample_rate))
+
+    edges = [0] + cuts + [len(samples)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def merge_transcripts(pieces, offsets) -> dict:
+    """Stitches per-chunk transcripts back into one, shifting timings by each chunk's offset in seconds."""
+    segments = []
+    for piece, offset in zip(pieces, offsets):
+        for segment in piece.get("segments", []):
+            words = [
+                dict(word, start=round(word["start"] + offset, 3), end=round(word["end"] + offset, 3))
+                for word in segment.get("words", [])
+            ]
+            segments.append(
+                dict(segment, start=round(segment["start"] + offset, 3), end=round(segment["end"] + offset, 3), words=words)
+            )
+    return {"text": " ".join(segment["text"].strip() for segment in segments), "segments": segments, "language": "en"}
+
+
+class Transcriber:
+    """
+    Word timings for a voice track, cached by audio content and model.
+
+    In "align" mode the known text is force-aligned to the audio first and Whisper
+    only runs when alignment isn't confident; "whisper" mode always decodes. The
+    Whisper model is loaded on first use and kept for the lifetime of the object.
+
+    `backend` picks the Whisper implementation (see BACKENDS). Tracks longer than
+    chunk_seconds are split at silences and, when the backend allows it, the chunks
+    are decoded on `workers` threads; the result has the same segments/words shape
+    either way.
+    """
+
+    def __init__(self, cache_dir: Path, model_name: str = "medium", device: str = "cpu", mode: str = "align",
+                 backend: str = "whisper_timestamped", compute_type: str = "int8", workers: int = 1,
+                 chunk_seconds: float = CHUNK_SECONDS):
+        self.cache = TranscriptCache(cache_dir)
+        self.backend = BACKENDS[backend](model_name, device=device, compute_type=compute_type, workers=workers)
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.chunk_seconds = chunk_seconds
+
+    def load_model(self):
+        return self.backend.load_model()
+
+    def _whisper(self, samples: np.ndarray) -> dict:
+        chunks = silence_chunks(samples, SAMPLE_RATE, self.chunk_seconds)
+        with tracing.span("whisper", backend=self.backend.key, chunks=len(chunks), seconds=len(samples) / SAMPLE_RATE):
+            if len(chunks) == 1:
+                return self.backend.transcribe(samples)
+            pieces = [samples[start:end] for start, end in chunks]
+            workers = self.workers if self.backend.parallel else 1
+            self.backend.load_model()  # once, before the threads race for it
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(self.backend.transcribe, pieces))
+            return merge_transcripts(results, [start / SAMPLE_RATE for start, _ in chunks])
+
+    def transcribe(self, samples: np.ndarray, text: str = None) -> dict:
+        """`samples` are mono 16 kHz float32, as returned by load_samples."""
+        whisper_key = audio_key(samples, f"{self.backend.key}:{self.chunk_seconds}")
+        cached = self.cache.get(whisper_key)
+        if cached is not None:
+            return cached
+
+        if self.mode == "align" and text:
+            # the timings come from the text as much as the audio, so an edited body must miss
+            align_key = audio_key(samples, f"align:{hashlib.sha256(text.encode()).hexdigest()}")
+            cached = self.cache.get(align_key)
+            if cached is not None:
+                return cached
+            with tracing.span("align", seconds=len(samples) / SAMPLE_RATE):
+                aligned = align_text(text, samples)
+            if aligned is not None:
+                self.cache.put(align_key, aligned)
+                return aligned
+
+        transcript = self._whisper(samples)
+        self.cache.put(whisper_key, transcript)
+        return transcript
@@ -0,0 +1,13 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+
+
+@pytest.fixture(autouse=True)
+def in_src(monkeypatch):
+    # the modules resolve ../data and friends against src/, as when run from there
+    monkeypatch.chdir(SRC)
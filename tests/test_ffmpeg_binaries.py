@@ -0,0 +1,17 @@
+import ffmpeg_binaries
+
+
+def test_binaries_follow_config_set_after_import(tmp_path, monkeypatch):
+    monkeypatch.delenv("FFPROBE_BINARY", raising=False)
+    monkeypatch.delenv("FFMPEG_BINARY", raising=False)
+    assert ffmpeg_binaries.ffmpeg() == "ffmpeg"
+    assert ffmpeg_binaries.ffprobe() == "ffprobe"
+
+    (tmp_path / "ffmpeg").touch()
+    (tmp_path / "ffprobe").touch()
+    monkeypatch.setenv("FFMPEG_BINARY", str(tmp_path / "ffmpeg"))
+    assert ffmpeg_binaries.ffmpeg() == str(tmp_path / "ffmpeg")
+    assert ffmpeg_binaries.ffprobe() == str(tmp_path / "ffprobe")
+
+    monkeypatch.setenv("FFPROBE_BINARY", "/opt/ffmpeg/bin/ffprobe")
+    assert ffmpeg_binaries.ffprobe() == "/opt/ffmpeg/bin/ffprobe"
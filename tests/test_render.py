@@ -0,0 +1,55 @@
+"""
+End-to-end renders on the benchmark's synthetic fixtures. They need ffmpeg and the
+full render stack, so they are skipped where those aren't installed.
+"""
+import json
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("moviepy")
+if shutil.which("ffmpeg") is None:
+    pytest.skip("ffmpeg is not installed", allow_module_level=True)
+
+import benchmark  # noqa: E402
+
+
+def count_frames(path) -> int:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-count_frames", "-select_streams", "v:0",
+         "-show_entries", "stream=nb_read_frames", "-of", "json", str(path)],
+        capture_output=True, text=True, check=True,
+    )
+    return int(json.loads(result.stdout)["streams"][0]["nb_read_frames"])
+
+
+@pytest.mark.parametrize("renderer", ["moviepy", "ffmpeg"])
+def test_render_with_tracing(tmp_path, monkeypatch, renderer):
+    metrics = tmp_path / "metrics.jsonl"
+    chrome = tmp_path / "trace.json"
+    chrome.write_text("[\n")
+    monkeypatch.setenv("TRACE_METRICS", str(metrics))
+    monkeypatch.setenv("TRACE_CHROME", str(chrome))
+    monkeypatch.setenv("TRACE_FRAME_SAMPLE", "10")
+
+    report = benchmark.run([20], mode="draft", renderers=[renderer], composite_frames=5, keep=tmp_path / "out")
+
+    assert renderer in report["runs"][0]["encode_fps"]
+    assert (tmp_path / "out" / f"bench20_{renderer}.mp4").stat().st_size > 0
+    records = [json.loads(line) for line in metrics.read_text().splitlines()]
+    (render,) = [r for r in records if r["name"] == "render"]
+    assert render["renderer"] == renderer
+    assert render["video_seconds"] == pytest.approx(report["runs"][0]["duration"], abs=0.01)
+    assert any(r["name"] == "frame" for r in records)
+
+
+def test_segmented_render_frame_count(tmp_path):
+    # long enough for the intro cut plus at least two body segments
+    report = benchmark.run(
+        [90], mode="draft", renderers=["moviepy"], composite_frames=1, keep=tmp_path / "out", segment_workers=2
+    )
+
+    # every segment writes exactly its frames, so the concat has the timeline's frame count
+    assert count_frames(tmp_path / "out" / "bench90_moviepy.mp4") == report["runs"][0]["frames"]
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import subtitles  # noqa: E402
+
+
+class Blob:
+    def __init__(self, nbytes: int):
+        self.nbytes = nbytes
+
+
+def test_byte_lru_evicts_least_recently_used():
+    cache = subtitles.ByteLRU(100)
+    for key in [1, 2, 3, 1, 4]:
+        cache.get(key, lambda: Blob(40))
+    assert list(cache._items) == [1, 4]
+    assert cache.nbytes == 80
+
+
+def test_budget_follows_environment_set_after_import(monkeypatch):
+    cache = subtitles.ByteLRU(lambda: subtitles.cache_bytes() // 3)
+    monkeypatch.setenv("SUBTITLE_CACHE_BYTES", "300")
+    for key in range(5):
+        cache.get(key, lambda: Blob(40))
+    assert cache.nbytes <= 100
@@ -0,0 +1,39 @@
+import json
+
+import tracing
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_span_attrs_may_reuse_field_names(tmp_path, monkeypatch):
+    metrics = tmp_path / "metrics.jsonl"
+    monkeypatch.setenv("TRACE_METRICS", str(metrics))
+
+    with tracing.span("render", name="clip.mp4", duration=123.0, start=1, renderer="ffmpeg"):
+        pass
+
+    (record,) = read_records(metrics)
+    assert record["name"] == "render"
+    assert record["duration"] < 123.0
+    assert record["renderer"] == "ffmpeg"
+
+
+def test_chrome_trace_keeps_every_attr(tmp_path, monkeypatch):
+    chrome = tmp_path / "trace.json"
+    chrome.write_text("[\n")
+    monkeypatch.setenv("TRACE_CHROME", str(chrome))
+
+    tracing.emit("frame", 10.0, 0.5, {"duration": 2, "output": tmp_path})
+
+    event = json.loads(chrome.read_text().splitlines()[-1].rstrip(","))
+    assert event["dur"] == 500000
+    assert event["args"] == {"duration": 2, "output": str(tmp_path)}
+
+
+def test_span_is_free_when_disabled(monkeypatch):
+    monkeypatch.delenv("TRACE_METRICS", raising=False)
+    monkeypatch.delenv("TRACE_CHROME", raising=False)
+    with tracing.span("render", duration=1.0):
+        pass
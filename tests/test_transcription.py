@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import transcription  # noqa: E402
+
+SAMPLE_RATE = transcription.SAMPLE_RATE
+
+
+def speech(*phrases: float, pause: float = 0.4) -> np.ndarray:
+    """Tone bursts of the given lengths in seconds, separated by silent pauses."""
+    rng = np.random.default_rng(0)
+    pieces = [np.zeros(int(pause * SAMPLE_RATE), dtype=np.float32)]
+    for seconds in phrases:
+        pieces.append((0.3 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32))
+        pieces.append(np.zeros(int(pause * SAMPLE_RATE), dtype=np.float32))
+    return np.concatenate(pieces)
+
+
+def test_align_snaps_phrase_breaks_to_pauses():
+    samples = speech(1.0, 1.0, 1.0)
+    aligned = transcription.align_text("one two three, four five six, seven eight nine.", samples)
+
+    assert aligned is not None
+    assert [len(segment["words"]) for segment in aligned["segments"]] == [3, 3, 3]
+
+
+def test_align_without_phrase_breaks_is_not_trusted():
+    samples = speech(3.0)
+    assert transcription.align_text("one two three four five six seven eight nine", samples) is None
+
+
+def test_align_cache_is_keyed_on_text(tmp_path, monkeypatch):
+    transcriber = transcription.Transcriber(tmp_path, mode="align")
+    samples = speech(1.0, 1.0)
+    monkeypatch.setattr(transcriber, "_whisper", lambda samples: pytest.fail("alignment should have been trusted"))
+
+    first = transcriber.transcribe(samples, "alpha beta, gamma delta.")
+    second = transcriber.transcribe(samples, "epsilon zeta, eta theta.")
+
+    assert first["text"] == "alpha beta, gamma delta."
+    assert second["text"] == "epsilon zeta, eta theta."
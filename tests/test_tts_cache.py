@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+
+import tiktokvoice  # noqa: E402
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiktokvoice, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(tiktokvoice, "_cache_bytes", None)
+    return tmp_path
+
+
+def test_concurrent_writes_of_one_chunk(cache_dir):
+    errors = []
+
+    def write(value: int) -> None:
+        try:
+            for _ in range(50):
+                tiktokvoice._cache_put("en_us_010", "same chunk", "http://tts", bytes([value]) * 1000)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [path.suffix for path in cache_dir.rglob("*") if path.is_file()] == [".mp3"]
+    assert len(tiktokvoice._cache_get("en_us_010", "same chunk", "http://tts")) == 1000
+
+
+def test_cache_write_failure_does_not_fail_request(cache_dir, monkeypatch):
+    client = tiktokvoice.TTSClient(endpoints=[{"url": "http://tts", "response": "data"}])
+
+    class Response:
+        status_code = 200
+
+        def json(self):
+            return {"data": "aGVsbG8="}
+
+    def broken_put(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(client.session, "post", lambda *args, **kwargs: Response())
+    monkeypatch.setattr(tiktokvoice, "_cache_put", broken_put)
+    try:
+        assert client._request({"url": "http://tts", "response": "data"}, "en_us_010", "hi") == b"hello"
+    finally:
+        client.close()